@@ -39,5 +39,8 @@ setup(
             "black>=23.0.0",
             "flake8>=6.0.0",
         ],
+        "re2": [
+            "google-re2>=1.1",
+        ],
     },
 )
@@ -8,14 +8,42 @@ language model outputs.
 
 __version__ = "0.1.0"
 
+import importlib
+from typing import TYPE_CHECKING
+
 from .generation_state_tracker import GenerationStateTracker
-from .margin_renderer import MarginRenderer
-from .visual_margin_generator import VisualMarginGenerator
 from .constraint_parser import ConstraintParser
 
+if TYPE_CHECKING:
+    from .margin_renderer import MarginRenderer
+    from .visual_margin_generator import VisualMarginGenerator
+
+# These pull in Pillow and the Anthropic SDK, so they are imported on first
+# attribute access (PEP 562) instead of with the package.
+_LAZY_IMPORTS = {
+    "MarginRenderer": ".margin_renderer",
+    "VisualMarginGenerator": ".visual_margin_generator",
+}
+
 __all__ = [
     "GenerationStateTracker",
     "MarginRenderer",
     "VisualMarginGenerator",
     "ConstraintParser",
 ]
+
+
+def __getattr__(name):
+    """Import lazily exported classes on first access."""
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """Include lazily exported classes in dir() before they are imported."""
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
@@ -4,20 +4,177 @@ Constraint Parser
 Extracts structural constraints from natural language prompts.
 """
 
+import functools
 import re
-from typing import Dict, Any, Optional
+from collections import Counter
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# google-re2 runs the patterns on a linear-time automaton instead of Python's
+# backtracking engine. None of the patterns use lookaround or backreferences,
+# so they compile unchanged under either engine; the only difference is that
+# RE2's \d and \s are ASCII-only. (PCRE2 with JIT would be a comparable
+# alternative backend.)
+try:
+    import re2 as _re
+except ImportError:
+    _re = re
+
+
+# Word-to-number mapping
+_WORD_TO_NUM = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
+    'eleven': 11, 'twelve': 12, 'thirteen': 13, 'fourteen': 14, 'fifteen': 15,
+    'sixteen': 16, 'seventeen': 17, 'eighteen': 18, 'nineteen': 19, 'twenty': 20,
+}
+
+# Read-only view for ConstraintParser.WORD_TO_NUM. The patterns and lookup
+# table below are derived from the mapping at import time, so edits to it
+# would silently have no effect. Lookups stay on the plain dicts, which are
+# faster than going through the proxy.
+_WORD_TO_NUM_VIEW = MappingProxyType(_WORD_TO_NUM)
+
+# Number words plus the decimal spellings of every count a prompt
+# realistically asks for, so _extract_number resolves the usual cases with
+# one hash lookup instead of isdecimal() + int(). Larger numbers fall back
+# to int().
+_NUM_LOOKUP = {str(i): i for i in range(1000)}
+_NUM_LOOKUP.update(_WORD_TO_NUM)
+
+# Digits or any number word, shared by the patterns that accept both. Digits
+# come first as the common case, and longer words precede their prefixes
+# ("seventeen" before "seven") so the engine does not have to backtrack.
+_NUM_ALT = r'(\d+|' + '|'.join(sorted(_WORD_TO_NUM, key=len, reverse=True)) + ')'
+
+# Patterns are compiled once at import time rather than looked up in the
+# regex module cache on every parse.
+
+# Line patterns
+# Exact count: "4 lines", "four lines"
+_LINE_EXACT_RE = _re.compile(rf'(?:exactly\s+)?{_NUM_ALT}\s+lines?')
+# "a 4-line poem"
+_LINE_HYPHEN_RE = _re.compile(r'a\s+(\d+)-line')
+
+# Paragraph patterns
+# Exact count: "3 paragraphs", "three paragraphs"
+_PARA_EXACT_RE = _re.compile(rf'(?:exactly\s+)?{_NUM_ALT}\s+paragraphs?')
+
+# Word count patterns
+_WORD_RANGE_RE = _re.compile(r'(?:between\s+)?(\d+)\s*(?:and|-)\s*(\d+)\s+words?')
+_WORD_MAX_RE = _re.compile(r'(?:under|less than|max|maximum|no more than|at most)\s+(\d+)\s+words?')
+_WORD_MIN_RE = _re.compile(r'(?:over|more than|min|minimum|at least)\s+(\d+)\s+words?')
+_WORD_APPROX_RE = _re.compile(r'(?:about|around|approximately)\s+(\d+)\s+words?')
+_WORD_EXACT_RE = _re.compile(r'(?:exactly\s+)?(\d+)\s+words?(?:\s+(?:of|in))?')
+
+# Character count patterns
+_CHAR_RANGE_RE = _re.compile(r'(?:between\s+)?(\d+)\s*(?:and|-)\s*(\d+)\s+(?:characters?|chars?)')
+_CHAR_MAX_RE = _re.compile(r'(?:under|less than|max|maximum)\s+(\d+)\s+(?:characters?|chars?)')
+_CHAR_MIN_RE = _re.compile(r'(?:over|more than|min|minimum|at least)\s+(\d+)\s+(?:characters?|chars?)')
+
+# Words per line patterns
+_WPL_EACH_RE = _re.compile(r'(?:each|every)\s+line\s+(?:is\s+)?(?:under|less than|max)\s+(\d+)\s+words?')
+_WPL_POSTFIX_RE = _re.compile(r'lines?\s+(?:under|less than)\s+(\d+)\s+words?\s+each')
+
+# Words per paragraph patterns
+_WPP_EACH_RE = _re.compile(r'(?:each|every)\s+(?:paragraph\s+)?(?:is\s+)?(?:under|less than|max)\s+(\d+)\s+words?')
+_WPP_POSTFIX_RE = _re.compile(r'paragraphs?\s+(?:under|less than)\s+(\d+)\s+words?\s+each')
+
+# Every pattern keyed by the name the extractors look it up by. No two of them
+# can match at the same offset, so the alternation order below only affects
+# speed; precedence between patterns of one constraint type is decided by the
+# extractors.
+_PATTERNS = {
+    'line_exact': _LINE_EXACT_RE,
+    'line_hyphen': _LINE_HYPHEN_RE,
+    'para_exact': _PARA_EXACT_RE,
+    'word_range': _WORD_RANGE_RE,
+    'word_max': _WORD_MAX_RE,
+    'word_min': _WORD_MIN_RE,
+    'word_approx': _WORD_APPROX_RE,
+    'word_exact': _WORD_EXACT_RE,
+    'char_range': _CHAR_RANGE_RE,
+    'char_max': _CHAR_MAX_RE,
+    'char_min': _CHAR_MIN_RE,
+    'wpl_each': _WPL_EACH_RE,
+    'wpl_postfix': _WPL_POSTFIX_RE,
+    'wpp_each': _WPP_EACH_RE,
+    'wpp_postfix': _WPP_POSTFIX_RE,
+}
+
+
+def _build_master(names: Tuple[str, ...]) -> Tuple[Any, Dict[int, str]]:
+    """
+    Compile the alternation of the named patterns, in the given order.
+
+    At any one offset at most one pattern can match, so the branch order
+    decides only how many branches are tried before the match is found,
+    never which match is found.
+
+    Args:
+        names: Pattern names from _PATTERNS in branch order
+
+    Returns:
+        Compiled master pattern and its capture group index to name mapping
+    """
+    master_pattern = '(?:' + '|'.join(_PATTERNS[name].pattern for name in names) + ')'
+    if _re is re:
+        # Reject positions that cannot start any pattern before trying the
+        # branches. RE2 has no lookahead and does not need it. A new pattern
+        # must start with one of these characters or it never matches;
+        # test_master_pattern_matches_every_pattern guards this.
+        master_pattern = r'(?=[\dabeflmnopstu])' + master_pattern
+    group_to_name = dict(enumerate(
+        (name for name in names for _ in range(_PATTERNS[name].groups)),
+        start=1,
+    ))
+    return _re.compile(master_pattern), group_to_name
+
+
+# Single alternation over all patterns so a prompt is scanned once instead of
+# once per pattern. Branches are not wrapped in named groups (in the stdlib
+# engine that defeats the first-literal check on each branch), so the matching
+# pattern is recovered from the index of its last capture group.
+_MASTER_RE, _GROUP_TO_NAME = _build_master(tuple(_PATTERNS))
+
+# How often each pattern fired during scans while
+# ConstraintParser.TRACK_HITS is enabled
+_HIT_COUNTS: Counter = Counter()
+
+# Shortest prompt any pattern can match ("1 line", "1 word")
+_MIN_CONSTRAINT_LEN = 6
+
+# Remainder of a number, skipped when resuming a scan from inside one
+_DIGITS_RE = _re.compile(r'\d*')
 
 
 class ConstraintParser:
     """Parses natural language to extract structural constraints."""
 
     # Word-to-number mapping
-    WORD_TO_NUM = {
-        'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
-        'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
-        'eleven': 11, 'twelve': 12, 'thirteen': 13, 'fourteen': 14, 'fifteen': 15,
-        'sixteen': 16, 'seventeen': 17, 'eighteen': 18, 'nineteen': 19, 'twenty': 20,
-    }
+    WORD_TO_NUM = _WORD_TO_NUM_VIEW
+
+    # Number of distinct prompts whose parse results are memoized per parser
+    CACHE_SIZE = 2048
+
+    # Count pattern hits for hit_stats() / reorder_by_frequency(). Off by
+    # default so the scan loop does no extra work.
+    TRACK_HITS = False
+
+    def __init__(self):
+        """Initialize the parser with an empty result cache."""
+        self._parse_cached = functools.lru_cache(maxsize=self.CACHE_SIZE)(self._parse_frozen)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Drop the result cache, which is bound to this instance, when pickling or copying."""
+        state = self.__dict__.copy()
+        del state['_parse_cached']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore the instance with a fresh result cache of its own."""
+        self.__dict__.update(state)
+        self._parse_cached = functools.lru_cache(maxsize=self.CACHE_SIZE)(self._parse_frozen)
 
     def parse(self, prompt: str) -> Dict[str, Any]:
         """
@@ -34,36 +191,156 @@ class ConstraintParser:
             - "3 paragraphs" -> {"paragraphs": {"target": 3, "tolerance": 0}}
             - "under 100 words" -> {"words": {"max": 100}}
             - "between 500-1000 characters" -> {"chars": {"min": 500, "max": 1000}}
+
+        Results are memoized per parser instance (keyed on the lowercased
+        prompt), and a fresh dictionary is returned on every call so callers
+        may modify it freely.
         """
-        prompt_lower = prompt.lower()
-        constraints = {}
+        # Menu input and file names never hold a constraint; skip lower()
+        if len(prompt) < _MIN_CONSTRAINT_LEN:
+            return {}
+        return self.parse_lower(prompt.lower())
 
-        # Parse line requirements
-        if line_match := self._extract_line_constraint(prompt_lower):
-            constraints['lines'] = line_match
+    def parse_lower(self, prompt_lower: str) -> Dict[str, Any]:
+        """
+        Extract structural constraints from an already lowercased prompt.
 
-        # Parse paragraph requirements
-        if para_match := self._extract_paragraph_constraint(prompt_lower):
-            constraints['paragraphs'] = para_match
+        Same as parse() without the lower() copy, for callers that already
+        hold the lowercase text. Uppercase input is not normalized and may
+        miss constraints.
 
-        # Parse word count requirements
-        if word_match := self._extract_word_constraint(prompt_lower):
-            constraints['words'] = word_match
+        Args:
+            prompt_lower: Lowercase prompt text
 
-        # Parse character count requirements
-        if char_match := self._extract_char_constraint(prompt_lower):
-            constraints['chars'] = char_match
+        Returns:
+            Dictionary of parsed constraints
+        """
+        frozen = self._parse_cached(prompt_lower)
+        return {key: dict(spec) for key, spec in frozen}
+
+    def parse_many(self, prompts: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Extract structural constraints from many prompts.
+
+        Equivalent to [parser.parse(p) for p in prompts], with the per-call
+        method dispatch hoisted out of the loop. Repeated prompts are served
+        from the same result cache as parse().
+
+        Args:
+            prompts: Natural language prompts
 
-        # Parse words per line requirements
-        if wpl_match := self._extract_words_per_line_constraint(prompt_lower):
-            constraints['words_per_line'] = wpl_match
+        Returns:
+            List of constraint dictionaries, one per prompt, in input order
+        """
+        parse_cached = self._parse_cached
+        return [
+            {key: dict(spec) for key, spec in parse_cached(prompt.lower())}
+            for prompt in prompts
+        ]
 
-        # Parse words per paragraph requirements
-        if wpp_match := self._extract_words_per_paragraph_constraint(prompt_lower):
-            constraints['words_per_paragraph'] = wpp_match
+    @staticmethod
+    def hit_stats() -> Dict[str, int]:
+        """
+        Report how often each pattern fired while TRACK_HITS was enabled.
+
+        Only scans are counted; prompts served from a result cache are not.
+
+        Returns:
+            Dictionary mapping pattern name to hit count, most frequent first
+        """
+        return dict(_HIT_COUNTS.most_common())
+
+    @staticmethod
+    def reorder_by_frequency() -> Tuple[str, ...]:
+        """
+        Rebuild the scan pattern so the most frequently hit patterns are tried first.
+
+        Shaped by the hits recorded with TRACK_HITS on a representative
+        workload. Patterns never hit keep their relative order at the end.
+        Results are unaffected, only the number of branches tried per match,
+        so cached results stay valid.
+
+        Returns:
+            Pattern names in their new order
+        """
+        global _MASTER_RE, _GROUP_TO_NAME
+        names = tuple(sorted(_PATTERNS, key=lambda name: -_HIT_COUNTS[name]))
+        _MASTER_RE, _GROUP_TO_NAME = _build_master(names)
+        return names
+
+    def _parse_frozen(self, prompt_lower: str) -> Tuple[Tuple[str, Tuple[Tuple[str, int], ...]], ...]:
+        """
+        Parse a lowercased prompt into a hashable, immutable form for caching.
+
+        Args:
+            prompt_lower: Lowercase prompt text
+
+        Returns:
+            Tuple of (constraint type, specification items) pairs
+        """
+        return tuple(
+            (key, tuple(spec.items()))
+            for key, spec in self._parse_uncached(prompt_lower).items()
+        )
+
+    def _parse_uncached(self, prompt_lower: str) -> Dict[str, Any]:
+        """
+        Extract structural constraints from a lowercased prompt.
+
+        Args:
+            prompt_lower: Lowercase prompt text
+
+        Returns:
+            Dictionary of parsed constraints
+        """
+        constraints = {}
+
+        # Every pattern contains one of these keywords, so a prompt without
+        # them skips the regex scan entirely. Spelled out rather than looped
+        # over: the generator costs more than the substring searches.
+        if not ('line' in prompt_lower or 'paragraph' in prompt_lower
+                or 'word' in prompt_lower or 'char' in prompt_lower):
+            return constraints
+
+        matches = self._scan(prompt_lower)
+        if not matches:
+            return constraints
+
+        # Each extractor resolves its own precedence among the matches
+        for key, extract in self._EXTRACTORS:
+            if spec := extract(self, matches):
+                constraints[key] = spec
 
         return constraints
 
+    def _scan(self, prompt: str) -> Dict[str, re.Match]:
+        """
+        Find the first match of every pattern in a single pass over the prompt.
+
+        Matches of different patterns may overlap (e.g. "each line is under
+        10 words" is both a words-per-line and a word-count constraint), so
+        the scan resumes just after each match start rather than at its end.
+        A pattern that matches from inside a number also matches from the
+        start of it, so the rest of the digits are skipped.
+
+        Args:
+            prompt: Lowercase prompt text
+
+        Returns:
+            Dictionary mapping pattern name to its leftmost match
+        """
+        matches: Dict[str, re.Match] = {}
+        pos = 0
+        while master_match := _MASTER_RE.search(prompt, pos):
+            name = _GROUP_TO_NAME[master_match.lastindex]
+            if self.TRACK_HITS:
+                _HIT_COUNTS[name] += 1
+            if name not in matches:
+                # Re-match the individual pattern to get its own group numbering
+                matches[name] = _PATTERNS[name].match(prompt, master_match.start())
+            pos = _DIGITS_RE.match(prompt, master_match.start() + 1).end()
+        return matches
+
     def _extract_number(self, text: str) -> Optional[int]:
         """
         Extract a number from text, handling both digits and word forms.
@@ -74,35 +351,27 @@ class ConstraintParser:
         Returns:
             Integer value or None
         """
-        # Try digit form first
-        if text.isdigit():
-            return int(text)
+        # Word forms and numbers below 1000 are a single hash lookup
+        num = _NUM_LOOKUP.get(text)
 
-        # Try word form
-        if text in self.WORD_TO_NUM:
-            return self.WORD_TO_NUM[text]
+        # Otherwise a long digit run; isdecimal() accepts exactly what int() does
+        if num is None and text.isdecimal():
+            num = int(text)
 
-        return None
+        return num
 
-    def _extract_line_constraint(self, prompt: str) -> Optional[Dict[str, Any]]:
+    def _extract_line_constraint(self, matches: Dict[str, re.Match]) -> Optional[Dict[str, Any]]:
         """
         Parse patterns like '4 lines', 'four lines', 'N lines'.
 
         Args:
-            prompt: Lowercase prompt text
+            matches: Pattern matches from _scan
 
         Returns:
             Constraint specification or None
         """
-        patterns = [
-            # Exact count: "4 lines", "four lines"
-            r'(?:exactly\s+)?(\d+|one|two|three|four|five|six|seven|eight|nine|ten)\s+lines?',
-            # "a 4-line poem"
-            r'a\s+(\d+)-line',
-        ]
-
-        for pattern in patterns:
-            if match := re.search(pattern, prompt):
+        for name in ('line_exact', 'line_hyphen'):
+            if match := matches.get(name):
                 num_text = match.group(1)
                 num = self._extract_number(num_text)
                 if num:
@@ -110,137 +379,160 @@ class ConstraintParser:
 
         return None
 
-    def _extract_paragraph_constraint(self, prompt: str) -> Optional[Dict[str, Any]]:
+    def _extract_paragraph_constraint(self, matches: Dict[str, re.Match]) -> Optional[Dict[str, Any]]:
         """
         Parse patterns like '3 paragraphs', 'several paragraphs'.
 
         Args:
-            prompt: Lowercase prompt text
+            matches: Pattern matches from _scan
 
         Returns:
             Constraint specification or None
         """
-        patterns = [
-            # Exact count: "3 paragraphs", "three paragraphs"
-            r'(?:exactly\s+)?(\d+|one|two|three|four|five|six|seven|eight|nine|ten)\s+paragraphs?',
-        ]
-
-        for pattern in patterns:
-            if match := re.search(pattern, prompt):
-                num_text = match.group(1)
-                num = self._extract_number(num_text)
-                if num:
-                    return {"target": num, "tolerance": 0}
+        if match := matches.get('para_exact'):
+            num_text = match.group(1)
+            num = self._extract_number(num_text)
+            if num:
+                return {"target": num, "tolerance": 0}
 
         return None
 
-    def _extract_word_constraint(self, prompt: str) -> Optional[Dict[str, Any]]:
+    def _extract_word_constraint(self, matches: Dict[str, re.Match]) -> Optional[Dict[str, Any]]:
         """
         Parse patterns like 'under 100 words', '50-75 words', 'about 200 words'.
 
         Args:
-            prompt: Lowercase prompt text
+            matches: Pattern matches from _scan
 
         Returns:
             Constraint specification or None
         """
         # Range: "between 100 and 200 words", "100-200 words"
-        if match := re.search(r'(?:between\s+)?(\d+)\s*(?:and|-)\s*(\d+)\s+words?', prompt):
+        if match := matches.get('word_range'):
             min_words = int(match.group(1))
             max_words = int(match.group(2))
             return {"min": min_words, "max": max_words}
 
         # Maximum: "under 100 words", "less than 100 words", "max 100 words"
-        if match := re.search(r'(?:under|less than|max|maximum|no more than|at most)\s+(\d+)\s+words?', prompt):
+        if match := matches.get('word_max'):
             max_words = int(match.group(1))
             return {"max": max_words}
 
         # Minimum: "over 100 words", "more than 100 words", "at least 100 words"
-        if match := re.search(r'(?:over|more than|min|minimum|at least)\s+(\d+)\s+words?', prompt):
+        if match := matches.get('word_min'):
             min_words = int(match.group(1))
             return {"min": min_words}
 
         # Approximate: "about 100 words", "around 100 words"
-        if match := re.search(r'(?:about|around|approximately)\s+(\d+)\s+words?', prompt):
+        if match := matches.get('word_approx'):
             target = int(match.group(1))
             tolerance = max(5, int(target * 0.1))  # 10% tolerance or 5 words minimum
             return {"target": target, "tolerance": tolerance}
 
         # Exact: "exactly 100 words", "100 words"
-        if match := re.search(r'(?:exactly\s+)?(\d+)\s+words?(?:\s+(?:of|in))?', prompt):
+        if match := matches.get('word_exact'):
             target = int(match.group(1))
             return {"target": target, "tolerance": 0}
 
         return None
 
-    def _extract_char_constraint(self, prompt: str) -> Optional[Dict[str, Any]]:
+    def _extract_char_constraint(self, matches: Dict[str, re.Match]) -> Optional[Dict[str, Any]]:
         """
         Parse character count requirements.
 
         Args:
-            prompt: Lowercase prompt text
+            matches: Pattern matches from _scan
 
         Returns:
             Constraint specification or None
         """
         # Range: "between 500-1000 characters"
-        if match := re.search(r'(?:between\s+)?(\d+)\s*(?:and|-)\s*(\d+)\s+(?:characters?|chars?)', prompt):
+        if match := matches.get('char_range'):
             min_chars = int(match.group(1))
             max_chars = int(match.group(2))
             return {"min": min_chars, "max": max_chars}
 
         # Maximum: "under 500 characters"
-        if match := re.search(r'(?:under|less than|max|maximum)\s+(\d+)\s+(?:characters?|chars?)', prompt):
+        if match := matches.get('char_max'):
             max_chars = int(match.group(1))
             return {"max": max_chars}
 
         # Minimum: "at least 500 characters"
-        if match := re.search(r'(?:over|more than|min|minimum|at least)\s+(\d+)\s+(?:characters?|chars?)', prompt):
+        if match := matches.get('char_min'):
             min_chars = int(match.group(1))
             return {"min": min_chars}
 
         return None
 
-    def _extract_words_per_line_constraint(self, prompt: str) -> Optional[Dict[str, Any]]:
+    def _extract_words_per_line_constraint(self, matches: Dict[str, re.Match]) -> Optional[Dict[str, Any]]:
         """
         Parse words per line constraints.
 
         Args:
-            prompt: Lowercase prompt text
+            matches: Pattern matches from _scan
 
         Returns:
             Constraint specification or None
         """
         # "each line is under 10 words", "each line under 10 words"
-        if match := re.search(r'(?:each|every)\s+line\s+(?:is\s+)?(?:under|less than|max)\s+(\d+)\s+words?', prompt):
+        if match := matches.get('wpl_each'):
             max_words = int(match.group(1))
             return {"max": max_words}
 
         # "lines under 10 words each"
-        if match := re.search(r'lines?\s+(?:under|less than)\s+(\d+)\s+words?\s+each', prompt):
+        if match := matches.get('wpl_postfix'):
             max_words = int(match.group(1))
             return {"max": max_words}
 
         return None
 
-    def _extract_words_per_paragraph_constraint(self, prompt: str) -> Optional[Dict[str, Any]]:
+    def _extract_words_per_paragraph_constraint(self, matches: Dict[str, re.Match]) -> Optional[Dict[str, Any]]:
         """
         Parse words per paragraph constraints.
 
         Args:
-            prompt: Lowercase prompt text
+            matches: Pattern matches from _scan
 
         Returns:
             Constraint specification or None
         """
         # "each paragraph under 50 words", "each under 50 words"
-        if match := re.search(r'(?:each|every)\s+(?:paragraph\s+)?(?:is\s+)?(?:under|less than|max)\s+(\d+)\s+words?', prompt):
+        if match := matches.get('wpp_each'):
             max_words = int(match.group(1))
             return {"max": max_words}
 
         # "paragraphs under 50 words each"
-        if match := re.search(r'paragraphs?\s+(?:under|less than)\s+(\d+)\s+words?\s+each', prompt):
+        if match := matches.get('wpp_postfix'):
             max_words = int(match.group(1))
             return {"max": max_words}
 
         return None
+
+    # Constraint types in output order, each with its extractor
+    _EXTRACTORS = (
+        ('lines', _extract_line_constraint),
+        ('paragraphs', _extract_paragraph_constraint),
+        ('words', _extract_word_constraint),
+        ('chars', _extract_char_constraint),
+        ('words_per_line', _extract_words_per_line_constraint),
+        ('words_per_paragraph', _extract_words_per_paragraph_constraint),
+    )
+
+
+_default_parser: Optional[ConstraintParser] = None
+
+
+def parse_many(prompts: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Extract structural constraints from many prompts with a shared parser.
+
+    Args:
+        prompts: Natural language prompts
+
+    Returns:
+        List of constraint dictionaries, one per prompt, in input order
+    """
+    global _default_parser
+    if _default_parser is None:
+        _default_parser = ConstraintParser()
+    return _default_parser.parse_many(prompts)
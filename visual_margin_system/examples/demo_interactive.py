@@ -9,6 +9,11 @@ import os
 import sys
 from visual_margin_system import VisualMarginGenerator, ConstraintParser
 
+_API_KEY = os.getenv('ANTHROPIC_API_KEY')
+
+# Shared parser so its result cache survives across menu iterations
+_PARSER = ConstraintParser()
+
 
 def print_header():
     """Print application header."""
@@ -40,8 +45,7 @@ def auto_constraint_mode(generator):
         return
 
     # Parse constraints from prompt
-    parser = ConstraintParser()
-    constraints = parser.parse(prompt)
+    constraints = _PARSER.parse(prompt)
 
     print(f"\nDetected constraints: {constraints}")
     print("\nGenerating...")
@@ -49,7 +53,8 @@ def auto_constraint_mode(generator):
     try:
         result = generator.generate_with_margin(
             prompt=prompt,
-            parse_constraints=True,
+            constraints=constraints,
+            parse_constraints=False,
             chunk_size=30
         )
 
@@ -146,8 +151,6 @@ def test_parser_mode():
     print("Mode: Test Constraint Parser")
     print("-" * 70)
 
-    parser = ConstraintParser()
-
     while True:
         prompt = input("\nEnter a prompt to parse (or 'back' to return): ").strip()
         if prompt.lower() == 'back':
@@ -156,7 +159,7 @@ def test_parser_mode():
         if not prompt:
             continue
 
-        constraints = parser.parse(prompt)
+        constraints = _PARSER.parse(prompt)
 
         print("\nParsed constraints:")
         if constraints:
@@ -215,14 +218,14 @@ def save_margin_mode(generator):
 def main():
     """Main interactive loop."""
     # Check for API key
-    if not os.getenv('ANTHROPIC_API_KEY'):
+    if not _API_KEY:
         print("Error: ANTHROPIC_API_KEY environment variable not set")
         print("Please set it with: export ANTHROPIC_API_KEY='your-key-here'")
         sys.exit(1)
 
     # Initialize generator
     generator = VisualMarginGenerator(
-        api_key=os.getenv('ANTHROPIC_API_KEY')
+        api_key=_API_KEY
     )
 
     print_header()
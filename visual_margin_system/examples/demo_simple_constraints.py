@@ -5,12 +5,10 @@ Demonstrates basic line and paragraph counting with the Visual Margin System.
 """
 
 import os
-from visual_margin_system import (
-    VisualMarginGenerator,
-    GenerationStateTracker,
-    MarginRenderer,
-    ConstraintParser
-)
+from visual_margin_system import VisualMarginGenerator
+
+# Read once for every demo
+_API_KEY = os.getenv('ANTHROPIC_API_KEY')
 
 
 def demo_exact_line_count():
@@ -21,7 +19,7 @@ def demo_exact_line_count():
 
     # Initialize generator
     generator = VisualMarginGenerator(
-        api_key=os.getenv('ANTHROPIC_API_KEY')
+        api_key=_API_KEY
     )
 
     # Generate with constraint
@@ -40,10 +38,10 @@ def demo_exact_line_count():
     print("-" * 60)
 
     # Verify constraint
-    lines = result.strip().split('\n')
-    print(f"\nLine count: {len(lines)}")
+    line_count = result.strip().count('\n') + 1
+    print(f"\nLine count: {line_count}")
     print(f"Target: 4 lines")
-    print(f"Constraint satisfied: {len(lines) == 4}")
+    print(f"Constraint satisfied: {line_count == 4}")
 
     # Save margin visualization
     generator.save_margin_image("demo_line_count_margin.png")
@@ -57,7 +55,7 @@ def demo_paragraph_count():
     print("=" * 60)
 
     generator = VisualMarginGenerator(
-        api_key=os.getenv('ANTHROPIC_API_KEY')
+        api_key=_API_KEY
     )
 
     prompt = "Write 3 paragraphs about artificial intelligence"
@@ -88,7 +86,7 @@ def demo_word_count_range():
     print("=" * 60)
 
     generator = VisualMarginGenerator(
-        api_key=os.getenv('ANTHROPIC_API_KEY')
+        api_key=_API_KEY
     )
 
     prompt = "Explain quantum computing in 50-75 words"
@@ -119,7 +117,7 @@ def demo_manual_constraints():
     print("=" * 60)
 
     generator = VisualMarginGenerator(
-        api_key=os.getenv('ANTHROPIC_API_KEY')
+        api_key=_API_KEY
     )
 
     prompt = "Write a haiku about technology"
@@ -144,15 +142,15 @@ def demo_manual_constraints():
     print(result)
     print("-" * 60)
 
-    lines = result.strip().split('\n')
-    print(f"\nLine count: {len(lines)}")
+    line_count = result.strip().count('\n') + 1
+    print(f"\nLine count: {line_count}")
     print(f"Target: 3 lines (haiku format)")
-    print(f"Constraint satisfied: {len(lines) == 3}")
+    print(f"Constraint satisfied: {line_count == 3}")
 
 
 if __name__ == "__main__":
     # Check for API key
-    if not os.getenv('ANTHROPIC_API_KEY'):
+    if not _API_KEY:
         print("Error: ANTHROPIC_API_KEY environment variable not set")
         print("Please set it with: export ANTHROPIC_API_KEY='your-key-here'")
         exit(1)
@@ -5,26 +5,232 @@ Maintains real-time structural metadata during generation including
 line counts, paragraph counts, word counts, and constraint satisfaction status.
 """
 
-import re
-from typing import Dict, List, Any
+from collections.abc import Sequence
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class _SnapshotView(Sequence):
+    """
+    Read-only view of an append-only list as it was when the view was made,
+    plus an optional trailing item.
+
+    Lets snapshots expose the tracker's lines and paragraphs without copying
+    them; later appends to the list do not show up in the view.
+    """
+
+    __slots__ = ('_items', '_length', '_tail')
+
+    def __init__(self, items: List[str], tail: Optional[str] = None):
+        self._items = items
+        self._length = len(items)
+        self._tail = () if tail is None else (tail,)
+
+    def __len__(self) -> int:
+        return self._length + len(self._tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError('snapshot index out of range')
+        if index < self._length:
+            return self._items[index]
+        return self._tail[0]
+
+    def __iter__(self):
+        yield from islice(self._items, self._length)
+        yield from self._tail
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, tuple, _SnapshotView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+# Maps each byte of ASCII text to 1 for whitespace (as str.split() sees it)
+# and 0 otherwise, so a word starts at every 0 that follows a 1
+_ASCII_SPACE_FLAGS = bytes.maketrans(
+    bytes(range(256)), bytes(c < 128 and chr(c).isspace() for c in range(256)))
+
+# Below this length str.split() is the faster way to count words
+_ASCII_SCAN_MIN = 64
+
+
+def _count_words(text: str) -> int:
+    """
+    Count the words in non-empty text, as len(text.split()) would.
+
+    Args:
+        text: Text to count
+
+    Returns:
+        Number of whitespace-separated words
+    """
+    if len(text) >= _ASCII_SCAN_MIN and text.isascii():
+        # Count word starts in one pass without building the words
+        flags = text.encode('ascii').translate(_ASCII_SPACE_FLAGS)
+        return flags.count(b'\x01\x00') + (flags[0] == 0)
+    return len(text.split())
+
+
+# A checker factory specializes the check for one constraint to its
+# specification. It returns (state the check depends on, check function), or
+# None if the constraint is never checked; the check returns the constraint's
+# status, or None to leave it unchanged.
+_CheckerFactory = Callable[
+    ['GenerationStateTracker', Dict[str, Any]],
+    Optional[Tuple[str, Callable[[], Optional[bool]]]],
+]
+
+
+def _count_checker(
+    depends_on: str,
+    count: Callable[['GenerationStateTracker'], int],
+    use_target: bool,
+    use_range: bool,
+) -> _CheckerFactory:
+    """
+    Create a checker factory for a constraint on a single count.
+
+    Args:
+        depends_on: State the count is derived from
+        count: Returns the tracker's current count
+        use_target: Whether 'target'/'tolerance' applies (checked first)
+        use_range: Whether 'min' and 'max' together form a range; otherwise
+            'min' takes precedence over 'max'
+
+    Returns:
+        Checker factory
+    """
+    def factory(tracker, constraint_spec):
+        if use_target and 'target' in constraint_spec:
+            tolerance = constraint_spec.get('tolerance', 0)
+            low = constraint_spec['target'] - tolerance
+            high = constraint_spec['target'] + tolerance
+        elif use_range and 'min' in constraint_spec and 'max' in constraint_spec:
+            low, high = constraint_spec['min'], constraint_spec['max']
+        elif 'min' in constraint_spec:
+            low = constraint_spec['min']
+            return depends_on, lambda: count(tracker) >= low
+        elif 'max' in constraint_spec:
+            high = constraint_spec['max']
+            return depends_on, lambda: count(tracker) <= high
+        else:
+            return None
+        return depends_on, lambda: low <= count(tracker) <= high
+
+    return factory
+
+
+def _per_item_checker(
+    depends_on: str,
+    extremes: Callable[['GenerationStateTracker'], Any],
+) -> _CheckerFactory:
+    """
+    Create a checker factory for a word count bound on every line/paragraph.
+
+    Every item is within bounds iff the fewest and most words on any item are.
+
+    Args:
+        depends_on: State holding the items
+        extremes: Returns (fewest, most) words per item, or a falsy value
+            while there are no items
+
+    Returns:
+        Checker factory
+    """
+    def factory(tracker, constraint_spec):
+        has_min = 'min' in constraint_spec
+        has_max = 'max' in constraint_spec
+        min_words = constraint_spec.get('min')
+        max_words = constraint_spec.get('max')
+
+        def check() -> Optional[bool]:
+            words = extremes(tracker)
+            if not words:
+                return None  # Nothing to check yet
+            fewest, most = words
+            return (not has_max or most <= max_words) and (not has_min or fewest >= min_words)
+
+        return depends_on, check
+
+    return factory
+
+
+# Checker factory per constraint type. Which spec keys apply, and in which
+# order, differs per type.
+_CHECKERS: Dict[str, _CheckerFactory] = {
+    'lines': _count_checker(
+        'lines', lambda tracker: len(tracker.lines), use_target=True, use_range=False),
+    'paragraphs': _count_checker(
+        'paragraphs', lambda tracker: len(tracker.paragraphs), use_target=True, use_range=False),
+    'words': _count_checker(
+        'total_words', lambda tracker: tracker.total_words, use_target=True, use_range=True),
+    'chars': _count_checker(
+        'total_chars', lambda tracker: tracker.total_chars, use_target=False, use_range=True),
+    'words_per_line': _per_item_checker(
+        'lines', lambda tracker: tracker.lines and (tracker._line_words_min, tracker._line_words_max)),
+    'words_per_paragraph': _per_item_checker(
+        'paragraphs',
+        lambda tracker: tracker.paragraphs and (tracker._paragraph_words_min, tracker._paragraph_words_max)),
+}
 
 
 class GenerationStateTracker:
     """Tracks generation state and constraint satisfaction in real-time."""
 
+    # One tracker is created per generation and its counters are updated on
+    # every token, so attributes live in fixed slots rather than a __dict__
+    __slots__ = (
+        'total_tokens', 'total_chars', 'total_words',
+        'lines', 'paragraphs', 'current_line', '_paragraph_lines',
+        'constraints', 'constraint_status', 'generation_complete',
+        '_checkers', '_check_all', '_generated_parts',
+        '_line_words_min', '_line_words_max',
+        '_paragraph_words_min', '_paragraph_words_max',
+        '_last_was_space',
+    )
+
     def __init__(self):
         """Initialize the state tracker with empty state."""
         self.total_tokens = 0
         self.total_chars = 0
         self.total_words = 0
+        # Append-only, so snapshots can share them (see _SnapshotView)
         self.lines: List[str] = []
         self.paragraphs: List[str] = []
         self.current_line = ""
-        self.current_paragraph = ""
+        # Completed lines of the paragraph in progress; with current_line they
+        # make up current_paragraph
+        self._paragraph_lines: List[str] = []
         self.constraints: Dict[str, Any] = {}
         self.constraint_status: Dict[str, bool] = {}
         self.generation_complete = False
-        self._generated_text = ""
+        # (constraint type, state it depends on, check) built by
+        # set_constraints; a check returns None to leave the status unchanged
+        self._checkers: List[Tuple[str, str, Callable[[], Optional[bool]]]] = []
+        # Set until the first check after set_constraints, which covers every
+        # constraint regardless of what changed
+        self._check_all = False
+        # Tokens are kept as a list and joined only when a snapshot needs them
+        self._generated_parts: List[str] = []
+        # Fewest and most words on any completed line and paragraph, kept up
+        # to date as they complete so the per-line and per-paragraph word
+        # constraints don't re-split every line on every token
+        self._line_words_min = self._paragraph_words_min = float('inf')
+        self._line_words_max = self._paragraph_words_max = 0
+        # Whether the last character seen was whitespace (or nothing yet), so
+        # the next non-space character starts a new word
+        self._last_was_space = True
 
     def set_constraints(self, constraints: Dict[str, Any]) -> None:
         """
@@ -35,6 +241,13 @@ class GenerationStateTracker:
         """
         self.constraints = constraints
         self.constraint_status = {key: False for key in constraints.keys()}
+        self._checkers = []
+        for constraint_type, constraint_spec in constraints.items():
+            factory = _CHECKERS.get(constraint_type)
+            checker = factory(self, constraint_spec) if factory else None
+            if checker is not None:
+                self._checkers.append((constraint_type, *checker))
+        self._check_all = True
 
     def update_with_token(self, token: str) -> None:
         """
@@ -43,117 +256,148 @@ class GenerationStateTracker:
         Args:
             token: The newly generated token/text chunk
         """
-        self._generated_text += token
+        changed = self._append_text(token)
         self.total_tokens += 1
-        self.total_chars += len(token)
-
-        # Process the token character by character to detect line breaks
-        for char in token:
-            self.current_line += char
-            self.current_paragraph += char
-
-            if char == '\n':
-                # Line break detected
-                line_content = self.current_line.rstrip('\n')
-                if line_content or len(self.lines) > 0:  # Don't count leading empty lines
-                    self.lines.append(line_content)
-                self.current_line = ""
-
-                # Check if this is a paragraph break (double newline)
-                if self.current_paragraph.endswith('\n\n'):
-                    para_content = self.current_paragraph.rstrip('\n')
-                    if para_content.strip():  # Only add non-empty paragraphs
-                        self.paragraphs.append(para_content.strip())
-                    self.current_paragraph = ""
-
-        # Update word count
-        self.total_words = len(self._generated_text.split())
-
-        # Check constraint satisfaction
+
+        # Check constraint satisfaction, only for the state that changed
+        self._check_constraints(changed)
+
+    def update_bulk(self, tokens: Iterable[str]) -> None:
+        """
+        Update state with many tokens at once, e.g. when replaying a recorded
+        generation.
+
+        Ends in the same state as calling update_with_token() for each token,
+        but processes their text in one pass and checks constraints once.
+
+        Args:
+            tokens: Generated tokens/text chunks, in order
+        """
+        tokens = list(tokens)
+        if not tokens:
+            return
+
+        self._append_text(''.join(tokens))
+        self.total_tokens += len(tokens)
+
+        # Each check depends only on the final state, so one full check
+        # matches checking after every token
         self._check_constraints()
 
-    def _check_constraints(self) -> None:
-        """Validate all active constraints against current state."""
-        for constraint_type, constraint_spec in self.constraints.items():
-            if constraint_type == 'lines':
-                current_count = len(self.lines)
-                if 'target' in constraint_spec:
-                    tolerance = constraint_spec.get('tolerance', 0)
-                    target = constraint_spec['target']
-                    self.constraint_status['lines'] = (
-                        target - tolerance <= current_count <= target + tolerance
-                    )
-                elif 'min' in constraint_spec:
-                    self.constraint_status['lines'] = current_count >= constraint_spec['min']
-                elif 'max' in constraint_spec:
-                    self.constraint_status['lines'] = current_count <= constraint_spec['max']
-
-            elif constraint_type == 'paragraphs':
-                current_count = len(self.paragraphs)
-                if 'target' in constraint_spec:
-                    tolerance = constraint_spec.get('tolerance', 0)
-                    target = constraint_spec['target']
-                    self.constraint_status['paragraphs'] = (
-                        target - tolerance <= current_count <= target + tolerance
-                    )
-                elif 'min' in constraint_spec:
-                    self.constraint_status['paragraphs'] = current_count >= constraint_spec['min']
-                elif 'max' in constraint_spec:
-                    self.constraint_status['paragraphs'] = current_count <= constraint_spec['max']
-
-            elif constraint_type == 'words':
-                if 'target' in constraint_spec:
-                    tolerance = constraint_spec.get('tolerance', 0)
-                    target = constraint_spec['target']
-                    self.constraint_status['words'] = (
-                        target - tolerance <= self.total_words <= target + tolerance
-                    )
-                elif 'min' in constraint_spec and 'max' in constraint_spec:
-                    self.constraint_status['words'] = (
-                        constraint_spec['min'] <= self.total_words <= constraint_spec['max']
-                    )
-                elif 'min' in constraint_spec:
-                    self.constraint_status['words'] = self.total_words >= constraint_spec['min']
-                elif 'max' in constraint_spec:
-                    self.constraint_status['words'] = self.total_words <= constraint_spec['max']
-
-            elif constraint_type == 'chars':
-                if 'min' in constraint_spec and 'max' in constraint_spec:
-                    self.constraint_status['chars'] = (
-                        constraint_spec['min'] <= self.total_chars <= constraint_spec['max']
-                    )
-                elif 'min' in constraint_spec:
-                    self.constraint_status['chars'] = self.total_chars >= constraint_spec['min']
-                elif 'max' in constraint_spec:
-                    self.constraint_status['chars'] = self.total_chars <= constraint_spec['max']
-
-            elif constraint_type == 'words_per_line':
-                # Check if all lines satisfy word count constraint
-                if self.lines:
-                    all_satisfy = True
-                    for line in self.lines:
-                        word_count = len(line.split())
-                        if 'max' in constraint_spec and word_count > constraint_spec['max']:
-                            all_satisfy = False
-                            break
-                        if 'min' in constraint_spec and word_count < constraint_spec['min']:
-                            all_satisfy = False
-                            break
-                    self.constraint_status['words_per_line'] = all_satisfy
-
-            elif constraint_type == 'words_per_paragraph':
-                # Check if all paragraphs satisfy word count constraint
-                if self.paragraphs:
-                    all_satisfy = True
-                    for para in self.paragraphs:
-                        word_count = len(para.split())
-                        if 'max' in constraint_spec and word_count > constraint_spec['max']:
-                            all_satisfy = False
-                            break
-                        if 'min' in constraint_spec and word_count < constraint_spec['min']:
-                            all_satisfy = False
-                            break
-                    self.constraint_status['words_per_paragraph'] = all_satisfy
+    def _append_text(self, text: str) -> Set[str]:
+        """
+        Add generated text to the counters, lines and paragraphs.
+
+        Args:
+            text: Newly generated text
+
+        Returns:
+            Names of the state that changed ('total_chars', 'total_words',
+            'lines', 'paragraphs')
+        """
+        line_count = len(self.lines)
+        paragraph_count = len(self.paragraphs)
+        word_count = self.total_words
+
+        self._generated_parts.append(text)
+        self.total_chars += len(text)
+
+        # Count words that start in this text, minus one that merely
+        # continues from the previous text (same rules as str.split())
+        if text:
+            words = _count_words(text)
+            if not self._last_was_space and not text[0].isspace():
+                words -= 1
+            self.total_words += words
+            self._last_was_space = text[-1].isspace()
+
+        if '\n' not in text:
+            self.current_line += text
+        else:
+            self._process_line_breaks(text)
+
+        changed = set()
+        if text:
+            changed.add('total_chars')
+        if self.total_words != word_count:
+            changed.add('total_words')
+        if len(self.lines) != line_count:
+            changed.add('lines')
+        if len(self.paragraphs) != paragraph_count:
+            changed.add('paragraphs')
+        return changed
+
+    def _process_line_breaks(self, token: str) -> None:
+        """
+        Split a token containing newlines into completed lines and paragraphs.
+
+        Args:
+            token: Token text with at least one newline
+        """
+        # Every newline completes the current line
+        parts = token.split('\n')
+        parts[0] = self.current_line + parts[0]
+        self.current_line = parts.pop()
+
+        # An empty line after at least one line of the paragraph in progress
+        # is a double newline, which completes the paragraph
+        paragraph_lines = self._paragraph_lines
+        for line in parts:
+            if not line and paragraph_lines:
+                self._finish_paragraph('\n'.join(paragraph_lines))
+                paragraph_lines = self._paragraph_lines = []
+            else:
+                paragraph_lines.append(line)
+
+        if not self.lines:
+            # Don't count leading empty lines
+            while parts and not parts[0]:
+                del parts[0]
+        if parts:
+            self.lines.extend(parts)
+            word_counts = [len(line.split()) for line in parts]
+            self._line_words_min = min(self._line_words_min, *word_counts)
+            self._line_words_max = max(self._line_words_max, *word_counts)
+
+    def _finish_paragraph(self, paragraph: str) -> None:
+        """
+        Record a completed paragraph unless it is blank.
+
+        Args:
+            paragraph: Paragraph text up to the break
+        """
+        para_content = paragraph.strip()
+        if para_content:  # Only add non-empty paragraphs
+            self.paragraphs.append(para_content)
+            word_count = len(para_content.split())
+            self._paragraph_words_min = min(self._paragraph_words_min, word_count)
+            self._paragraph_words_max = max(self._paragraph_words_max, word_count)
+
+    @property
+    def current_paragraph(self) -> str:
+        """Current incomplete paragraph, rebuilt from its lines."""
+        return ''.join(line + '\n' for line in self._paragraph_lines) + self.current_line
+
+    def _check_constraints(self, changed: Optional[Set[str]] = None) -> None:
+        """
+        Validate active constraints against current state.
+
+        Args:
+            changed: State that changed since the last check ('lines',
+                'paragraphs', 'total_words', 'total_chars'); None checks every
+                constraint
+        """
+        if self._check_all:
+            changed = None
+            self._check_all = False
+        elif changed is not None and not changed:
+            return
+
+        for constraint_type, depends_on, check in self._checkers:
+            if changed is None or depends_on in changed:
+                status = check()
+                if status is not None:
+                    self.constraint_status[constraint_type] = status
 
         # Update completion status
         if self.constraints:
@@ -166,15 +410,28 @@ class GenerationStateTracker:
         Returns:
             Dictionary containing all current state information
         """
+        # Join the tokens so far and keep the result as the only part, so
+        # repeated snapshots between tokens don't join them again
+        parts = self._generated_parts
+        if len(parts) > 1:
+            parts[:] = [''.join(parts)]
+        generated_text = parts[0] if parts else ""
+
         # Count current line if it has content
         current_line_count = len(self.lines)
-        if self.current_line.strip():
+        current_line = self.current_line
+        if current_line.strip():
             current_line_count += 1
+        else:
+            current_line = None
 
         # Count current paragraph if it has content
         current_para_count = len(self.paragraphs)
-        if self.current_paragraph.strip() and not self.current_paragraph.endswith('\n\n'):
+        current_paragraph = self.current_paragraph.strip()
+        if current_paragraph:
             current_para_count += 1
+        else:
+            current_paragraph = None
 
         return {
             'total_tokens': self.total_tokens,
@@ -182,12 +439,12 @@ class GenerationStateTracker:
             'total_words': self.total_words,
             'line_count': current_line_count,
             'paragraph_count': current_para_count,
-            'lines': self.lines + ([self.current_line] if self.current_line.strip() else []),
-            'paragraphs': self.paragraphs + ([self.current_paragraph.strip()] if self.current_paragraph.strip() and not self.current_paragraph.endswith('\n\n') else []),
+            'lines': _SnapshotView(self.lines, current_line),
+            'paragraphs': _SnapshotView(self.paragraphs, current_paragraph),
             'constraints': self.constraints,
             'constraint_status': self.constraint_status,
             'generation_complete': self.generation_complete,
-            'generated_text': self._generated_text,
+            'generated_text': generated_text,
         }
 
     def check_constraints(self) -> Dict[str, bool]:
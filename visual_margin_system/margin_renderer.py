@@ -7,36 +7,200 @@ by vision-language models.
 
 import base64
 import io
-from typing import Dict, Any, Tuple
+import queue
+import threading
+from enum import IntEnum
+from typing import Any, Callable, Dict, Optional, Tuple
 from PIL import Image, ImageDraw, ImageFont
 
 
+class Role(IntEnum):
+    """Index of each color role in a THEME_TABLE palette."""
+
+    BACKGROUND = 0
+    TEXT = 1
+    SATISFIED = 2
+    WARNING = 3
+    UNSATISFIED = 4
+    BORDER = 5
+    SECTION_BG = 6
+
+
+# Theme palettes as flat tuples of RGB colors, indexed by Role
+THEME_TABLE: Dict[str, Tuple[Tuple[int, int, int], ...]] = {
+    'dark': (
+        (30, 30, 30),      # background
+        (220, 220, 220),   # text
+        (80, 200, 120),    # satisfied (green)
+        (255, 200, 50),    # warning (yellow)
+        (255, 100, 100),   # unsatisfied (red)
+        (100, 100, 100),   # border
+        (45, 45, 45),      # section_bg
+    ),
+    'light': (
+        (255, 255, 255),   # background
+        (30, 30, 30),      # text
+        (34, 139, 34),     # satisfied (green)
+        (255, 165, 0),     # warning (orange)
+        (220, 20, 60),     # unsatisfied (red)
+        (180, 180, 180),   # border
+        (240, 240, 240),   # section_bg
+    ),
+}
+
+
+def _count_near_target(count_key: str) -> Callable[[Dict[str, Any], Dict[str, Any]], bool]:
+    """
+    Create a warning test for a count constraint on target, max or min.
+
+    Args:
+        count_key: State key holding the current count
+
+    Returns:
+        Function (state, spec) -> whether the count is within 10% of the bound
+    """
+    def is_near_target(state, constraint_spec):
+        current = state[count_key]
+        target = constraint_spec.get('target') or constraint_spec.get('max') or constraint_spec.get('min', 0)
+        return target > 0 and abs(current - target) / target <= 0.1
+
+    return is_near_target
+
+
+def _words_near_target(state: Dict[str, Any], constraint_spec: Dict[str, Any]) -> bool:
+    """Whether the word count is within 10% of its target or over 90% of its max."""
+    current = state['total_words']
+    target = constraint_spec.get('target')
+    if target and abs(current - target) / target <= 0.1:
+        return True
+    max_words = constraint_spec.get('max')
+    return bool(max_words and current / max_words >= 0.9)
+
+
+# Warning test per constraint type; other types have no warning state
+_COLORERS: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], bool]] = {
+    'lines': _count_near_target('line_count'),
+    'paragraphs': _count_near_target('paragraph_count'),
+    'words': _words_near_target,
+}
+
+
+# A label template renders one constraint's label from the current state.
+# Template factories resolve which spec keys apply once per spec, and
+# return None if none do.
+_LabelTemplate = Callable[[Dict[str, Any]], str]
+
+
+def _count_label(
+    label: str, count_key: str, use_target: bool, use_range: bool
+) -> Callable[[Dict[str, Any]], Optional[_LabelTemplate]]:
+    """
+    Create a label template factory for a constraint on a single count.
+
+    Args:
+        label: Label shown before the count
+        count_key: State key holding the current count
+        use_target: Whether a 'target' is shown (checked first)
+        use_range: Whether 'min' and 'max' together are shown as a range
+
+    Returns:
+        Function spec -> label template, or None if no key applies
+    """
+    def make_template(constraint_spec):
+        prefix = f"{label}: "
+        if use_target and 'target' in constraint_spec:
+            suffix = f"/{constraint_spec['target']}"
+        elif use_range and 'min' in constraint_spec and 'max' in constraint_spec:
+            suffix = f" ({constraint_spec['min']}-{constraint_spec['max']})"
+        elif 'max' in constraint_spec:
+            suffix = f" (max {constraint_spec['max']})"
+        elif 'min' in constraint_spec:
+            suffix = f" (min {constraint_spec['min']})"
+        else:
+            return None
+        return lambda state: f"{prefix}{state[count_key]}{suffix}"
+
+    return make_template
+
+
+def _per_item_label(label: str) -> Callable[[Dict[str, Any]], Optional[_LabelTemplate]]:
+    """
+    Create a label template factory for a per-line/per-paragraph word bound.
+
+    Args:
+        label: Label shown before the bound
+
+    Returns:
+        Function spec -> label template, or None if no key applies
+    """
+    def make_template(constraint_spec):
+        if 'max' in constraint_spec:
+            text = f"{label}: ≤ {constraint_spec['max']}"
+        elif 'min' in constraint_spec:
+            text = f"{label}: ≥ {constraint_spec['min']}"
+        else:
+            return None
+        return lambda state: text
+
+    return make_template
+
+
+# Label template factory per constraint type
+_LABELS: Dict[str, Callable[[Dict[str, Any]], Optional[_LabelTemplate]]] = {
+    'lines': _count_label('Lines', 'line_count', use_target=True, use_range=False),
+    'paragraphs': _count_label('Paragraphs', 'paragraph_count', use_target=True, use_range=False),
+    'words': _count_label('Words', 'total_words', use_target=True, use_range=True),
+    'chars': _count_label('Chars', 'total_chars', use_target=False, use_range=True),
+    'words_per_line': _per_item_label('Words/line'),
+    'words_per_paragraph': _per_item_label('Words/para'),
+}
+
+# Output formats for render_to_base64: media type and PIL save options. The
+# margin is re-encoded on every update, so both favour encoding speed: PNG is
+# flat UI graphics that deflate well even at the fastest level, and WebP at
+# its fastest method gives about half the payload for a little more CPU.
+IMAGE_FORMATS: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    'PNG': ('image/png', {'compress_level': 1}),
+    'WEBP': ('image/webp', {'quality': 80, 'method': 0}),
+}
+
+
 class MarginRenderer:
     """Renders generation state as visual margin images."""
 
-    # Color schemes
+    __slots__ = (
+        'width', 'height', 'theme', 'mode', 'image_format', 'media_type',
+        'palette', 'colors', 'font_config', '_save_options',
+        '_fills', '_background_cache', '_last_render_key', '_last_base64',
+        '_prepared_constraints', '_label_templates',
+        '_render_lock', '_render_thread', '_pending_states', '_frame_ready',
+        '_latest_base64', '_render_error', '_text_masks',
+    )
+
+    # Rasterized strings kept by _draw_text before the cache starts over
+    _TEXT_MASK_LIMIT = 512
+
+    # Fields left out when pickling or copying: the background worker state,
+    # and the label templates, which are closures rebuilt by prepare()
+    _TRANSIENT_SLOTS = frozenset((
+        '_render_lock', '_render_thread', '_pending_states', '_frame_ready',
+        '_latest_base64', '_render_error', '_prepared_constraints', '_label_templates',
+    ))
+
+    # Color schemes by role name, derived from THEME_TABLE
     THEMES = {
-        'dark': {
-            'background': (30, 30, 30),
-            'text': (220, 220, 220),
-            'satisfied': (80, 200, 120),  # Green
-            'warning': (255, 200, 50),    # Yellow
-            'unsatisfied': (255, 100, 100),  # Red
-            'border': (100, 100, 100),
-            'section_bg': (45, 45, 45),
-        },
-        'light': {
-            'background': (255, 255, 255),
-            'text': (30, 30, 30),
-            'satisfied': (34, 139, 34),   # Green
-            'warning': (255, 165, 0),     # Orange
-            'unsatisfied': (220, 20, 60),  # Red
-            'border': (180, 180, 180),
-            'section_bg': (240, 240, 240),
-        }
+        theme: {role.name.lower(): palette[role] for role in Role}
+        for theme, palette in THEME_TABLE.items()
     }
 
-    def __init__(self, width: int = 300, height: int = 600, theme: str = "dark"):
+    def __init__(
+        self,
+        width: int = 300,
+        height: int = 600,
+        theme: str = "dark",
+        mode: str = "RGB",
+        image_format: str = "PNG"
+    ):
         """
         Initialize the margin renderer.
 
@@ -44,12 +208,68 @@ class MarginRenderer:
             width: Width of the rendered margin in pixels
             height: Height of the rendered margin in pixels
             theme: Color theme ('dark' or 'light')
+            mode: Image mode, 'RGB' or 'P'. 'P' draws with the theme palette
+                only, giving several times smaller and faster-to-encode PNGs
+                at the cost of aliased (non-smoothed) text.
+            image_format: Encoding for render_to_base64, 'PNG' or 'WEBP'
+                (see IMAGE_FORMATS)
         """
+        if mode not in ('RGB', 'P'):
+            raise ValueError(f"Unsupported image mode: {mode!r}")
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format!r}")
+
         self.width = width
         self.height = height
         self.theme = theme
+        self.mode = mode
+        self.image_format = image_format
+        self.media_type, self._save_options = IMAGE_FORMATS[image_format]
+        self.palette = THEME_TABLE[theme]
         self.colors = self.THEMES[theme]
+        # Fill value per Role for drawing: the RGB color, or in 'P' mode the
+        # palette index, which is the Role itself
+        self._fills = self.palette if mode == 'RGB' else tuple(int(role) for role in Role)
         self.font_config = self._load_font_config()
+        # Static layout per constraint count, see _get_background
+        self._background_cache: Dict[int, Image.Image] = {}
+        # Key and output of the last render_to_base64 call
+        self._last_render_key: Optional[Tuple] = None
+        self._last_base64: Optional[str] = None
+        # Rasterized text per (font, text), see _draw_text
+        self._text_masks: Dict[Tuple[str, str], Tuple[Optional[Image.Image], int, int]] = {}
+        self._reset_transient_state()
+
+    def _reset_transient_state(self) -> None:
+        """Set up the lock, an idle background worker and no label templates."""
+        # Constraints the label templates were built for, see prepare()
+        self._prepared_constraints: Dict[str, Any] = {}
+        self._label_templates: Dict[str, _LabelTemplate] = {}
+        # Background rendering, see render_to_base64_async(). The lock keeps
+        # the worker and direct render_to_base64() and prepare() calls from
+        # updating the caches at the same time. The queue and event exist
+        # only while the worker thread runs.
+        self._render_lock = threading.RLock()
+        self._render_thread: Optional[threading.Thread] = None
+        self._pending_states: Optional[queue.Queue] = None
+        self._frame_ready: Optional[threading.Event] = None
+        self._latest_base64: Optional[str] = None
+        # Error from the worker's last failed render, raised to the caller
+        self._render_error: Optional[BaseException] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Capture the configuration and caches, leaving out the transient state."""
+        return {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if name not in self._TRANSIENT_SLOTS and hasattr(self, name)
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore a renderer with its own lock and no worker thread."""
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._reset_transient_state()
 
     def _load_font_config(self) -> Dict[str, Any]:
         """
@@ -85,69 +305,124 @@ class MarginRenderer:
         Args:
             state: State snapshot from GenerationStateTracker
 
+        Returns:
+            PIL Image object
+        """
+        constraints = state.get('constraints')
+        constraint_count = len(constraints) if constraints else 0
+
+        # Start from the cached static layout for this many constraints
+        image = self._get_background(constraint_count).copy()
+
+        y_offset = 55
+
+        # Render constraints section
+        if constraints:
+            y_offset = self._render_constraint_section(image, state, y_offset)
+            y_offset += 10
+
+        # Render metrics section
+        self._render_metrics_section(image, state, y_offset)
+
+        return image
+
+    def _get_background(self, constraint_count: int) -> Image.Image:
+        """
+        Return the static part of the margin, rendering it on first use.
+
+        The title, separators and section headers depend only on how many
+        constraint rows sit between them, so one image is cached per count.
+        Callers must copy it before drawing.
+
+        Args:
+            constraint_count: Number of constraint rows
+
+        Returns:
+            Shared background image
+        """
+        background = self._background_cache.get(constraint_count)
+        if background is None:
+            background = self._render_background(constraint_count)
+            self._background_cache[constraint_count] = background
+        return background
+
+    def _render_background(self, constraint_count: int) -> Image.Image:
+        """
+        Render the title, separators and section headers.
+
+        Args:
+            constraint_count: Number of constraint rows
+
         Returns:
             PIL Image object
         """
         # Create canvas
-        image = Image.new('RGB', (self.width, self.height), self.colors['background'])
+        image = Image.new(self.mode, (self.width, self.height), self._fills[Role.BACKGROUND])
+        if self.mode == 'P':
+            image.putpalette([channel for color in self.palette for channel in color])
         draw = ImageDraw.Draw(image)
 
         y_offset = 10
 
         # Render title
-        draw.text((10, y_offset), "Generation State", fill=self.colors['text'], font=self.font_config['title'])
+        draw.text((10, y_offset), "Generation State", fill=self._fills[Role.TEXT], font=self.font_config['title'])
         y_offset += 30
 
         # Draw separator
-        draw.line([(10, y_offset), (self.width - 10, y_offset)], fill=self.colors['border'], width=1)
+        draw.line([(10, y_offset), (self.width - 10, y_offset)], fill=self._fills[Role.BORDER], width=1)
         y_offset += 15
 
-        # Render constraints section
-        if state.get('constraints'):
-            y_offset = self._render_constraint_section(draw, state, y_offset)
-            y_offset += 10
+        # Constraints header, followed by one row per constraint
+        if constraint_count:
+            draw.text((10, y_offset), "Constraints", fill=self._fills[Role.TEXT], font=self.font_config['header'])
+            y_offset += 25 + 20 * constraint_count + 10
 
-        # Render metrics section
-        self._render_metrics_section(draw, state, y_offset)
+        # Metrics separator and header
+        draw.line([(10, y_offset), (self.width - 10, y_offset)], fill=self._fills[Role.BORDER], width=1)
+        y_offset += 15
+        draw.text((10, y_offset), "Current Metrics", fill=self._fills[Role.TEXT], font=self.font_config['header'])
 
         return image
 
-    def _render_constraint_section(self, draw: ImageDraw.Draw, state: Dict[str, Any], y_offset: int) -> int:
+    def _render_constraint_section(self, image: Image.Image, state: Dict[str, Any], y_offset: int) -> int:
         """
         Render constraint checklist with visual status indicators.
 
         Args:
-            draw: ImageDraw object
+            image: Image to draw on
             state: State snapshot
             y_offset: Current vertical position
 
         Returns:
             Updated y_offset
         """
-        draw.text((10, y_offset), "Constraints", fill=self.colors['text'], font=self.font_config['header'])
+        # Header is part of the background
         y_offset += 25
 
         constraints = state.get('constraints', {})
         constraint_status = state.get('constraint_status', {})
+        if constraints != self._prepared_constraints:
+            self.prepare(constraints)
+        label_templates = self._label_templates
 
         for constraint_type, constraint_spec in constraints.items():
             is_satisfied = constraint_status.get(constraint_type, False)
 
             # Determine status color and indicator
             if is_satisfied:
-                color = self.colors['satisfied']
+                role = Role.SATISFIED
                 indicator = "✓"
             else:
                 # Check if we're close to the target (warning state)
-                color = self._get_constraint_color(state, constraint_type, constraint_spec)
-                indicator = "○" if color == self.colors['warning'] else "✗"
+                role = self._get_constraint_role(state, constraint_type, constraint_spec)
+                indicator = "○" if role == Role.WARNING else "✗"
 
             # Draw indicator
-            draw.text((15, y_offset), indicator, fill=color, font=self.font_config['body'])
+            self._draw_text(image, (15, y_offset), indicator, role, 'body')
 
             # Draw constraint description
-            constraint_text = self._format_constraint_text(constraint_type, constraint_spec, state)
-            draw.text((35, y_offset), constraint_text, fill=self.colors['text'], font=self.font_config['small'])
+            constraint_text = label_templates[constraint_type](state)
+            self._draw_text(image, (35, y_offset), constraint_text, Role.TEXT, 'small')
             y_offset += 20
 
         return y_offset
@@ -164,29 +439,26 @@ class MarginRenderer:
         Returns:
             RGB color tuple
         """
+        return self.palette[self._get_constraint_role(state, constraint_type, constraint_spec)]
+
+    def _get_constraint_role(self, state: Dict[str, Any], constraint_type: str, constraint_spec: Dict[str, Any]) -> Role:
+        """
+        Determine the color role of an unsatisfied constraint.
+
+        Args:
+            state: Current state
+            constraint_type: Type of constraint
+            constraint_spec: Constraint specification
+
+        Returns:
+            Role.WARNING if close to the target, otherwise Role.UNSATISFIED
+        """
         # Check if we're within 10% of target (warning state)
-        if constraint_type == 'lines':
-            current = state['line_count']
-            target = constraint_spec.get('target') or constraint_spec.get('max') or constraint_spec.get('min', 0)
-            if target > 0 and abs(current - target) / target <= 0.1:
-                return self.colors['warning']
-
-        elif constraint_type == 'paragraphs':
-            current = state['paragraph_count']
-            target = constraint_spec.get('target') or constraint_spec.get('max') or constraint_spec.get('min', 0)
-            if target > 0 and abs(current - target) / target <= 0.1:
-                return self.colors['warning']
-
-        elif constraint_type == 'words':
-            current = state['total_words']
-            target = constraint_spec.get('target')
-            if target and abs(current - target) / target <= 0.1:
-                return self.colors['warning']
-            max_words = constraint_spec.get('max')
-            if max_words and current / max_words >= 0.9:
-                return self.colors['warning']
-
-        return self.colors['unsatisfied']
+        is_near_target = _COLORERS.get(constraint_type)
+        if is_near_target is not None and is_near_target(state, constraint_spec):
+            return Role.WARNING
+
+        return Role.UNSATISFIED
 
     def _format_constraint_text(self, constraint_type: str, constraint_spec: Dict[str, Any], state: Dict[str, Any]) -> str:
         """
@@ -200,76 +472,62 @@ class MarginRenderer:
         Returns:
             Formatted constraint text
         """
-        if constraint_type == 'lines':
-            current = state['line_count']
-            if 'target' in constraint_spec:
-                return f"Lines: {current}/{constraint_spec['target']}"
-            elif 'max' in constraint_spec:
-                return f"Lines: {current} (max {constraint_spec['max']})"
-            elif 'min' in constraint_spec:
-                return f"Lines: {current} (min {constraint_spec['min']})"
-
-        elif constraint_type == 'paragraphs':
-            current = state['paragraph_count']
-            if 'target' in constraint_spec:
-                return f"Paragraphs: {current}/{constraint_spec['target']}"
-            elif 'max' in constraint_spec:
-                return f"Paragraphs: {current} (max {constraint_spec['max']})"
-            elif 'min' in constraint_spec:
-                return f"Paragraphs: {current} (min {constraint_spec['min']})"
-
-        elif constraint_type == 'words':
-            current = state['total_words']
-            if 'target' in constraint_spec:
-                return f"Words: {current}/{constraint_spec['target']}"
-            elif 'min' in constraint_spec and 'max' in constraint_spec:
-                return f"Words: {current} ({constraint_spec['min']}-{constraint_spec['max']})"
-            elif 'max' in constraint_spec:
-                return f"Words: {current} (max {constraint_spec['max']})"
-            elif 'min' in constraint_spec:
-                return f"Words: {current} (min {constraint_spec['min']})"
-
-        elif constraint_type == 'chars':
-            current = state['total_chars']
-            if 'min' in constraint_spec and 'max' in constraint_spec:
-                return f"Chars: {current} ({constraint_spec['min']}-{constraint_spec['max']})"
-            elif 'max' in constraint_spec:
-                return f"Chars: {current} (max {constraint_spec['max']})"
-            elif 'min' in constraint_spec:
-                return f"Chars: {current} (min {constraint_spec['min']})"
-
-        elif constraint_type == 'words_per_line':
-            if 'max' in constraint_spec:
-                return f"Words/line: ≤ {constraint_spec['max']}"
-            elif 'min' in constraint_spec:
-                return f"Words/line: ≥ {constraint_spec['min']}"
-
-        elif constraint_type == 'words_per_paragraph':
-            if 'max' in constraint_spec:
-                return f"Words/para: ≤ {constraint_spec['max']}"
-            elif 'min' in constraint_spec:
-                return f"Words/para: ≥ {constraint_spec['min']}"
-
-        return f"{constraint_type}: {constraint_spec}"
-
-    def _render_metrics_section(self, draw: ImageDraw.Draw, state: Dict[str, Any], y_offset: int) -> int:
+        return self._make_label_template(constraint_type, constraint_spec)(state)
+
+    def _make_label_template(self, constraint_type: str, constraint_spec: Dict[str, Any]) -> _LabelTemplate:
+        """
+        Resolve the label format for a constraint specification.
+
+        Args:
+            constraint_type: Type of constraint
+            constraint_spec: Constraint specification
+
+        Returns:
+            Function mapping a state to the constraint's label text
+        """
+        make_template = _LABELS.get(constraint_type)
+        template = make_template(constraint_spec) if make_template else None
+        if template is not None:
+            return template
+
+        text = f"{constraint_type}: {constraint_spec}"
+        return lambda state: text
+
+    def prepare(self, constraints: Dict[str, Any]) -> None:
+        """
+        Precompute the constraint labels for a set of constraints.
+
+        Called automatically when rendering a state whose constraints
+        differ from the prepared ones; calling it up front when constraints
+        are set keeps that work off the first render.
+
+        Args:
+            constraints: Dictionary of constraint specifications
+        """
+        with self._render_lock:
+            self._prepared_constraints = {
+                constraint_type: dict(constraint_spec)
+                for constraint_type, constraint_spec in constraints.items()
+            }
+            self._label_templates = {
+                constraint_type: self._make_label_template(constraint_type, constraint_spec)
+                for constraint_type, constraint_spec in constraints.items()
+            }
+
+    def _render_metrics_section(self, image: Image.Image, state: Dict[str, Any], y_offset: int) -> int:
         """
         Render current generation metrics.
 
         Args:
-            draw: ImageDraw object
+            image: Image to draw on
             state: State snapshot
             y_offset: Current vertical position
 
         Returns:
             Updated y_offset
         """
-        # Draw separator
-        draw.line([(10, y_offset), (self.width - 10, y_offset)], fill=self.colors['border'], width=1)
-        y_offset += 15
-
-        draw.text((10, y_offset), "Current Metrics", fill=self.colors['text'], font=self.font_config['header'])
-        y_offset += 25
+        # Separator and header are part of the background
+        y_offset += 40
 
         # Render metrics
         metrics = [
@@ -281,18 +539,67 @@ class MarginRenderer:
         ]
 
         for metric in metrics:
-            draw.text((15, y_offset), metric, fill=self.colors['text'], font=self.font_config['small'])
+            self._draw_text(image, (15, y_offset), metric, Role.TEXT, 'small')
             y_offset += 18
 
         # Completion status
         y_offset += 10
         if state.get('generation_complete'):
-            draw.text((15, y_offset), "Status: COMPLETE ✓", fill=self.colors['satisfied'], font=self.font_config['body'])
+            self._draw_text(image, (15, y_offset), "Status: COMPLETE ✓", Role.SATISFIED, 'body')
         else:
-            draw.text((15, y_offset), "Status: In Progress...", fill=self.colors['warning'], font=self.font_config['body'])
+            self._draw_text(image, (15, y_offset), "Status: In Progress...", Role.WARNING, 'body')
 
         return y_offset
 
+    def _draw_text(self, image: Image.Image, xy: Tuple[int, int], text: str, role: Role, font_name: str) -> None:
+        """
+        Draw text in a role's color, as ImageDraw.text would.
+
+        Most of the text changes little from frame to frame (status lines,
+        indicators, counts that haven't moved), so each string is rasterized
+        once per font and then pasted through as a mask.
+
+        Args:
+            image: Image to draw on
+            xy: Top-left text position
+            text: Text to draw
+            role: Role giving the text color
+            font_name: Key into font_config
+        """
+        key = (font_name, text)
+        cached = self._text_masks.get(key)
+        if cached is None:
+            if len(self._text_masks) >= self._TEXT_MASK_LIMIT:
+                self._text_masks.clear()
+            cached = self._text_masks[key] = self._rasterize_text(text, self.font_config[font_name])
+
+        mask, left, top = cached
+        if mask is not None:
+            image.paste(self._fills[role], (xy[0] + left, xy[1] + top), mask)
+
+    def _rasterize_text(self, text: str, font: Any) -> Tuple[Optional[Image.Image], int, int]:
+        """
+        Render text to a mask cropped to its bounding box.
+
+        Args:
+            text: Text to render
+            font: Font to render it in
+
+        Returns:
+            (mask, left, top) with the box's offset from the text position;
+            mask is None for text that draws nothing
+        """
+        # ImageDraw draws antialiased text on RGB images and aliased text on
+        # palette images, so the mask uses the matching mode
+        mask_mode = 'L' if self.mode == 'RGB' else '1'
+        left, top, right, bottom = font.getbbox(text, mode=mask_mode)
+        if right <= left or bottom <= top:
+            return None, 0, 0
+
+        mask = Image.new(mask_mode, (right - left, bottom - top), 0)
+        ImageDraw.Draw(mask).text((-left, -top), text, fill=255 if mask_mode == 'L' else 1, font=font)
+        return mask, left, top
+
     def render_to_base64(self, state: Dict[str, Any]) -> str:
         """
         Render and encode as base64 for API transmission.
@@ -301,14 +608,125 @@ class MarginRenderer:
             state: State snapshot from GenerationStateTracker
 
         Returns:
-            Base64-encoded PNG image string
+            Base64-encoded image string (PNG unless image_format says otherwise)
+        """
+        with self._render_lock:
+            # The same state renders to the same image, e.g. when the final
+            # margin is requested again after generation
+            key = self._render_key(state)
+            if key is not None and key == self._last_render_key:
+                return self._last_base64
+
+            image = self.render(state)
+
+            # Convert to base64
+            buffer = io.BytesIO()
+            image.save(buffer, format=self.image_format, **self._save_options)
+            image_base64 = base64.b64encode(buffer.getbuffer()).decode('ascii')
+
+            self._last_render_key = key
+            self._last_base64 = image_base64
+            return image_base64
+
+    def render_to_base64_async(self, state: Dict[str, Any]) -> str:
+        """
+        Queue a state for rendering on a background thread and return the
+        most recently completed frame.
+
+        Rendering and PNG encoding then overlap with the caller's own work,
+        e.g. waiting for the next chunk from the API. Only the newest queued
+        state is kept, so a slow render skips stale frames rather than
+        falling behind. Only the first call waits, for its own frame.
+
+        Meant to be called from a single thread; call close() when done.
+
+        Args:
+            state: State snapshot from GenerationStateTracker
+
+        Returns:
+            Base64-encoded image string, possibly for an earlier state
+
+        Raises:
+            Exception: Whatever rendering a queued state raised in the
+                background thread, re-raised on the next call
+        """
+        if self._render_thread is None:
+            self._pending_states = queue.Queue(maxsize=1)
+            self._frame_ready = threading.Event()
+            self._render_thread = threading.Thread(target=self._render_loop, daemon=True)
+            self._render_thread.start()
+
+        # Replace a state the worker hasn't picked up yet with the newer one
+        try:
+            self._pending_states.get_nowait()
+        except queue.Empty:
+            pass
+        self._pending_states.put_nowait(state)
+
+        self._frame_ready.wait()
+        error = self._render_error
+        if error is not None:
+            self._render_error = None
+            if self._latest_base64 is None:
+                # No frame to fall back on, so the next call waits again
+                self._frame_ready.clear()
+            raise error
+        return self._latest_base64
+
+    def _render_loop(self) -> None:
+        """Render queued states until close() queues None."""
+        while True:
+            state = self._pending_states.get()
+            if state is None:
+                return
+            try:
+                self._latest_base64 = self.render_to_base64(state)
+            except Exception as e:
+                # Keep the worker alive and hand the error to the caller
+                self._render_error = e
+            self._frame_ready.set()
+
+    def close(self) -> None:
+        """Stop the background render thread, if one was started."""
+        thread = self._render_thread
+        if thread is None:
+            return
+        # Queued behind any pending state, so that one is still rendered
+        self._pending_states.put(None)
+        thread.join()
+        self._render_thread = None
+        self._pending_states = None
+        self._frame_ready = None
+        self._latest_base64 = None
+        self._render_error = None
+
+    def _render_key(self, state: Dict[str, Any]) -> Optional[Tuple]:
         """
-        image = self.render(state)
+        Build a hashable key from every state field that affects the margin.
 
-        # Convert to base64
-        buffer = io.BytesIO()
-        image.save(buffer, format='PNG')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode('utf-8')
+        Args:
+            state: State snapshot from GenerationStateTracker
 
-        return image_base64
+        Returns:
+            Tuple key, or None if the constraints cannot be compared this way
+        """
+        constraints = state.get('constraints') or {}
+        try:
+            constraint_key = tuple(
+                (constraint_type, tuple(sorted(constraint_spec.items())))
+                for constraint_type, constraint_spec in constraints.items()
+            )
+            status_key = tuple(sorted((state.get('constraint_status') or {}).items()))
+        except (AttributeError, TypeError):
+            return None
+
+        return (
+            state.get('line_count', 0),
+            state.get('paragraph_count', 0),
+            state.get('total_words', 0),
+            state.get('total_chars', 0),
+            state.get('total_tokens', 0),
+            bool(state.get('generation_complete')),
+            constraint_key,
+            status_key,
+        )
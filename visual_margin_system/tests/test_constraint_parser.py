@@ -2,6 +2,10 @@
 Tests for ConstraintParser
 """
 
+import copy
+import pickle
+
+from visual_margin_system import constraint_parser
 from visual_margin_system.constraint_parser import ConstraintParser
 
 
@@ -120,6 +124,14 @@ class TestConstraintParser:
         assert result['words']['min'] == 100
         assert result['words']['max'] == 150
 
+    def test_parse_overlapping_constraints(self):
+        """Test constraints whose phrases overlap are all extracted."""
+        parser = ConstraintParser()
+
+        result = parser.parse("Write 10 lines under 5 words each")
+        assert result['lines']['target'] == 10
+        assert result['words_per_line']['max'] == 5
+
     def test_parse_no_constraints(self):
         """Test parsing prompt with no constraints."""
         parser = ConstraintParser()
@@ -127,6 +139,127 @@ class TestConstraintParser:
         result = parser.parse("Tell me a story")
         assert len(result) == 0
 
+    def test_parse_short_prompt(self):
+        """Test the shortest constrained prompt and shorter input."""
+        parser = ConstraintParser()
+
+        assert parser.parse("1 line") == {'lines': {'target': 1, 'tolerance': 0}}
+        assert parser.parse("back") == {}
+        assert parser.parse("") == {}
+
+    def test_parse_results_are_independent(self):
+        """Test modifying a parse result does not affect later results."""
+        parser = ConstraintParser()
+
+        result = parser.parse("Write under 100 words")
+        result['words']['max'] = 5
+        result['lines'] = {'target': 1}
+
+        assert parser.parse("Write under 100 words") == {'words': {'max': 100}}
+
+    def test_parse_lower(self):
+        """Test parsing a prompt that is already lowercase."""
+        parser = ConstraintParser()
+
+        prompt = "Write 3 Paragraphs, each UNDER 50 words"
+        assert parser.parse_lower(prompt.lower()) == parser.parse(prompt)
+
+    def test_parse_many(self):
+        """Test batch parsing matches parsing prompts one at a time."""
+        parser = ConstraintParser()
+        prompts = [
+            "Give me 4 lines of text",
+            "Tell me a story",
+            "Write 3 paragraphs, each under 50 words",
+            "Give me 4 lines of text",
+        ]
+
+        results = parser.parse_many(prompts)
+
+        assert results == [parser.parse(p) for p in prompts]
+        assert results[0] is not results[3]
+
+    def test_master_pattern_matches_every_pattern(self):
+        """Test the combined scan pattern matches every way each pattern can start."""
+        number_words = list(ConstraintParser.WORD_TO_NUM)
+        samples = {
+            'line_exact': ["exactly 4 lines", "4 lines"] + [f"{word} lines" for word in number_words],
+            'line_hyphen': ["a 4-line"],
+            'para_exact': ["exactly 3 paragraphs", "3 paragraphs"] + [f"{word} paragraphs" for word in number_words],
+            'word_range': ["between 100 and 200 words", "100-200 words"],
+            'word_max': ["under 100 words", "less than 100 words", "max 100 words",
+                         "maximum 100 words", "no more than 100 words", "at most 100 words"],
+            'word_min': ["over 100 words", "more than 100 words", "min 100 words",
+                         "minimum 100 words", "at least 100 words"],
+            'word_approx': ["about 100 words", "around 100 words", "approximately 100 words"],
+            'word_exact': ["exactly 100 words", "100 words"],
+            'char_range': ["between 500 and 1000 characters", "500-1000 chars"],
+            'char_max': ["under 500 characters", "less than 500 chars", "max 500 chars", "maximum 500 chars"],
+            'char_min': ["over 500 chars", "more than 500 chars", "min 500 chars",
+                         "minimum 500 chars", "at least 500 characters"],
+            'wpl_each': ["each line under 10 words", "every line is max 10 words"],
+            'wpl_postfix': ["lines under 10 words each", "line less than 10 words each"],
+            'wpp_each': ["each paragraph under 50 words", "every under 50 words"],
+            'wpp_postfix': ["paragraphs under 50 words each", "paragraph less than 50 words each"],
+        }
+
+        # A new pattern needs samples here, which then check that the scan
+        # pattern (including its first-character filter) can find it
+        assert set(samples) == set(constraint_parser._PATTERNS)
+        for name, prompts in samples.items():
+            for prompt in prompts:
+                match = constraint_parser._MASTER_RE.match(prompt)
+                assert match, prompt
+                assert constraint_parser._GROUP_TO_NAME[match.lastindex] == name, prompt
+
+    def test_pickle_round_trip(self):
+        """Test a pickled parser comes back with a working cache of its own."""
+        parser = ConstraintParser()
+        parser.parse("Write 3 paragraphs")
+
+        restored = pickle.loads(pickle.dumps(parser))
+
+        assert restored._parse_cached is not parser._parse_cached
+        assert restored.parse("Write 3 paragraphs") == {'paragraphs': {'target': 3, 'tolerance': 0}}
+        assert restored._parse_cached.cache_info().currsize == 1
+        assert parser._parse_cached.cache_info().currsize == 1
+
+    def test_deepcopy(self):
+        """Test a deep copy caches its results separately from the original."""
+        parser = ConstraintParser()
+        parser.parse("Write 3 paragraphs")
+
+        clone = copy.deepcopy(parser)
+
+        assert clone.parse("Give me 4 lines of text") == {'lines': {'target': 4, 'tolerance': 0}}
+        assert clone._parse_cached.cache_info().currsize == 1
+        assert parser._parse_cached.cache_info().currsize == 1
+
+    def test_reorder_by_frequency(self):
+        """Test reordering patterns by hit count keeps parse results."""
+        prompts = [
+            "Write 3 paragraphs, each under 50 words",
+            "Explain this in 50-75 words",
+            "Give me 4 lines of text",
+            "Write at least 200 characters",
+        ]
+        expected = ConstraintParser().parse_many(prompts)
+
+        parser = ConstraintParser()
+        parser.TRACK_HITS = True
+        try:
+            parser.parse_many(prompts)
+            stats = ConstraintParser.hit_stats()
+            assert stats['word_range'] == 1
+            assert stats['para_exact'] == 1
+
+            order = ConstraintParser.reorder_by_frequency()
+            assert set(order[:len(stats)]) == set(stats)
+            assert ConstraintParser().parse_many(prompts) == expected
+        finally:
+            constraint_parser._HIT_COUNTS.clear()
+            ConstraintParser.reorder_by_frequency()
+
     def test_number_word_conversion(self):
         """Test word-to-number conversion."""
         parser = ConstraintParser()
@@ -144,3 +277,10 @@ class TestConstraintParser:
                 assert result['lines']['target'] == expected
             elif 'paragraphs' in result:
                 assert result['paragraphs']['target'] == expected
+
+    def test_number_words_above_ten(self):
+        """Test word-form numbers up to twenty are recognized."""
+        parser = ConstraintParser()
+
+        assert parser.parse("Write seventeen lines")['lines']['target'] == 17
+        assert parser.parse("Write twenty paragraphs")['paragraphs']['target'] == 20
@@ -54,6 +54,51 @@ class TestGenerationStateTracker:
         state = tracker.get_state_snapshot()
         assert state['total_words'] == 8
 
+    def test_word_counting_across_tokens(self):
+        """Test words split across tokens are counted once."""
+        tracker = GenerationStateTracker()
+        for token in ["Hel", "lo wor", "ld", " ", "\n", "again\tand", " again"]:
+            tracker.update_with_token(token)
+
+        state = tracker.get_state_snapshot()
+        assert state['total_words'] == 5
+        assert state['generated_text'] == "Hello world \nagain\tand again"
+
+    def test_snapshot_lines_are_frozen(self):
+        """Test a snapshot's lines do not change as generation continues."""
+        tracker = GenerationStateTracker()
+        tracker.update_with_token("Line 1\nLine 2\nLine")
+
+        state = tracker.get_state_snapshot()
+        tracker.update_with_token(" 3\nLine 4\n\n")
+
+        assert state['lines'] == ["Line 1", "Line 2", "Line"]
+        assert state['lines'][-1] == "Line"
+        assert list(state['paragraphs']) == ["Line 1\nLine 2\nLine"]
+        assert len(tracker.get_state_snapshot()['lines']) == 5
+
+    def test_word_counting_long_chunks(self):
+        """Test long chunks count words like str.split(), ASCII or not."""
+        for chunk in [
+            "  one two\tthree\x1cfour\x0bfive  " * 4,
+            "word " * 20 + "café au lait\u00a0noir",
+        ]:
+            tracker = GenerationStateTracker()
+            tracker.update_with_token(chunk)
+            assert tracker.get_state_snapshot()['total_words'] == len(chunk.split())
+
+    def test_generated_text_across_snapshots(self):
+        """Test generated text stays complete between repeated snapshots."""
+        tracker = GenerationStateTracker()
+        tracker.update_with_token("Hello")
+        tracker.update_with_token(" world")
+
+        assert tracker.get_state_snapshot()['generated_text'] == "Hello world"
+        assert tracker.get_state_snapshot()['generated_text'] == "Hello world"
+
+        tracker.update_with_token("!")
+        assert tracker.get_state_snapshot()['generated_text'] == "Hello world!"
+
     def test_character_counting(self):
         """Test accurate character counting."""
         tracker = GenerationStateTracker()
@@ -113,6 +158,49 @@ class TestGenerationStateTracker:
         tracker.update_with_token("One two three four five six\n")
         assert not tracker.is_complete()  # Second line has 6 words, over max
 
+    def test_constraints_set_mid_generation(self):
+        """Test constraints set after text arrives are checked on the next token."""
+        tracker = GenerationStateTracker()
+        tracker.update_with_token("Line one\nLine two\n")
+
+        tracker.set_constraints({"lines": {"target": 2, "tolerance": 0}})
+        assert not tracker.is_complete()
+
+        tracker.update_with_token("")
+        assert tracker.is_complete()
+
+    def test_update_bulk_matches_per_token_updates(self):
+        """Test bulk updates end in the same state as per-token updates."""
+        tokens = ["First li", "ne here\nSecond", " line\n\nNew para", "graph\n"]
+        constraints = {"lines": {"target": 4, "tolerance": 0}, "words_per_line": {"max": 3}}
+
+        streamed = GenerationStateTracker()
+        streamed.set_constraints(constraints)
+        for token in tokens:
+            streamed.update_with_token(token)
+
+        replayed = GenerationStateTracker()
+        replayed.set_constraints(constraints)
+        replayed.update_bulk(tokens)
+
+        assert replayed.get_state_snapshot() == streamed.get_state_snapshot()
+        assert replayed.total_tokens == 4
+        assert replayed.is_complete()
+
+    def test_words_per_paragraph_constraint(self):
+        """Test words per paragraph constraint with min and max."""
+        tracker = GenerationStateTracker()
+        tracker.set_constraints({"words_per_paragraph": {"min": 2, "max": 4}})
+
+        tracker.update_with_token("One two three.\n\n")
+        assert tracker.is_complete()  # 3 words, within range
+
+        tracker.update_with_token("One.\n\n")
+        assert not tracker.is_complete()  # Second paragraph under min
+
+        tracker.update_with_token("One two.\n\n")
+        assert not tracker.is_complete()  # Earlier violation still counts
+
     def test_reset(self):
         """Test tracker reset functionality."""
         tracker = GenerationStateTracker()
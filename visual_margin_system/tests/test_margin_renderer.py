@@ -2,8 +2,14 @@
 Tests for MarginRenderer
 """
 
-from PIL import Image
-from visual_margin_system.margin_renderer import MarginRenderer
+import base64
+import copy
+import io
+import pickle
+
+import pytest
+from PIL import Image, ImageDraw
+from visual_margin_system.margin_renderer import MarginRenderer, Role
 
 
 class TestMarginRenderer:
@@ -57,6 +63,45 @@ class TestMarginRenderer:
         image = renderer.render(state)
         assert isinstance(image, Image.Image)
 
+    def test_background_is_cached_and_not_modified(self):
+        """Test the static background is reused without being drawn on."""
+        renderer = MarginRenderer()
+        state = {
+            'total_tokens': 10,
+            'total_chars': 50,
+            'total_words': 10,
+            'line_count': 2,
+            'paragraph_count': 1,
+            'constraints': {'lines': {'target': 4, 'tolerance': 0}},
+            'constraint_status': {'lines': False},
+            'generation_complete': False,
+        }
+
+        first = renderer.render(state)
+        background = renderer._get_background(1).tobytes()
+        second = renderer.render(state)
+
+        assert first.tobytes() == second.tobytes()
+        assert renderer._get_background(1).tobytes() == background
+        assert list(renderer._background_cache) == [1]
+
+    @pytest.mark.parametrize("mode", ["RGB", "P"])
+    def test_cached_text_matches_image_draw(self, mode):
+        """Test text pasted from the mask cache matches ImageDraw.text."""
+        renderer = MarginRenderer(mode=mode)
+        for text in ["Tokens: 150", "Status: COMPLETE ✓", "○", " "]:
+            expected = renderer._get_background(0).copy()
+            ImageDraw.Draw(expected).text(
+                (15, 200), text, fill=renderer._fills[Role.WARNING], font=renderer.font_config['body']
+            )
+
+            for _ in range(2):  # rasterized, then cached
+                actual = renderer._get_background(0).copy()
+                renderer._draw_text(actual, (15, 200), text, Role.WARNING, 'body')
+                assert actual.tobytes() == expected.tobytes()
+
+        assert ('body', "○") in renderer._text_masks
+
     def test_render_to_base64(self):
         """Test rendering to base64 string."""
         renderer = MarginRenderer()
@@ -75,6 +120,111 @@ class TestMarginRenderer:
         assert isinstance(base64_str, str)
         assert len(base64_str) > 0
 
+    def test_render_to_base64_reuses_unchanged_frame(self):
+        """Test an unchanged state is not rendered again."""
+        renderer = MarginRenderer()
+        state = {
+            'total_tokens': 10,
+            'total_chars': 50,
+            'total_words': 10,
+            'line_count': 2,
+            'paragraph_count': 1,
+            'constraints': {'lines': {'target': 4, 'tolerance': 0}},
+            'constraint_status': {'lines': False},
+            'generation_complete': False,
+        }
+
+        first = renderer.render_to_base64(state)
+        assert renderer.render_to_base64(dict(state)) is first
+
+        state['total_tokens'] = 11
+        assert renderer.render_to_base64(state) != first
+
+    def test_render_to_base64_async(self):
+        """Test background rendering returns completed frames."""
+        renderer = MarginRenderer()
+        state = {
+            'total_tokens': 10,
+            'total_chars': 50,
+            'total_words': 10,
+            'line_count': 2,
+            'paragraph_count': 1,
+            'constraints': {},
+            'constraint_status': {},
+            'generation_complete': False,
+        }
+
+        try:
+            # The first call waits for its own frame
+            assert renderer.render_to_base64_async(state) == renderer.render_to_base64(state)
+
+            for tokens in range(11, 20):
+                frame = renderer.render_to_base64_async(dict(state, total_tokens=tokens))
+                assert isinstance(frame, str) and frame
+        finally:
+            renderer.close()
+
+        # Once the worker has stopped, the newest state has been rendered
+        assert renderer._last_render_key[4] == 19
+
+    def test_render_to_base64_async_raises_render_errors(self):
+        """Test a failed background render raises instead of hanging."""
+        renderer = MarginRenderer()
+        bad_state = {'constraints': {'lines': {'target': 4}}, 'constraint_status': {}}
+        good_state = {
+            'total_tokens': 10,
+            'total_chars': 50,
+            'total_words': 10,
+            'line_count': 2,
+            'paragraph_count': 1,
+            'constraints': {},
+            'constraint_status': {},
+            'generation_complete': False,
+        }
+
+        with pytest.raises(KeyError):
+            renderer.render_to_base64(bad_state)
+
+        try:
+            with pytest.raises(KeyError):
+                renderer.render_to_base64_async(bad_state)
+
+            # The worker survives the failure and keeps rendering
+            assert renderer.render_to_base64_async(good_state) == renderer.render_to_base64(good_state)
+        finally:
+            renderer.close()
+
+    def test_pickle_round_trip(self):
+        """Test a renderer pickles and copies without its background worker."""
+        renderer = MarginRenderer(theme='light', image_format='WEBP')
+        state = {
+            'total_tokens': 10,
+            'total_chars': 50,
+            'total_words': 10,
+            'line_count': 2,
+            'paragraph_count': 1,
+            'constraints': {'lines': {'target': 4, 'tolerance': 0}},
+            'constraint_status': {'lines': False},
+            'generation_complete': False,
+        }
+
+        try:
+            expected = renderer.render_to_base64_async(state)
+            restored = pickle.loads(pickle.dumps(renderer))
+            clone = copy.deepcopy(renderer)
+        finally:
+            renderer.close()
+
+        for other in (restored, clone, copy.copy(renderer)):
+            assert other.media_type == 'image/webp'
+            assert other._render_thread is None
+            assert other._render_lock is not renderer._render_lock
+            assert other.render_to_base64(state) == expected
+            try:
+                assert other.render_to_base64_async(state) == expected
+            finally:
+                other.close()
+
     def test_theme_selection(self):
         """Test different theme selections."""
         dark_renderer = MarginRenderer(theme='dark')
@@ -84,6 +234,63 @@ class TestMarginRenderer:
         assert 'background' in dark_renderer.colors
         assert 'background' in light_renderer.colors
 
+    def test_palette_mode(self):
+        """Test rendering with a palette image draws only theme colors."""
+        renderer = MarginRenderer(mode='P')
+        state = {
+            'total_tokens': 10,
+            'total_chars': 50,
+            'total_words': 10,
+            'line_count': 2,
+            'paragraph_count': 1,
+            'constraints': {'lines': {'target': 4, 'tolerance': 0}},
+            'constraint_status': {'lines': False},
+            'generation_complete': False,
+        }
+
+        image = renderer.render(state)
+        assert image.mode == 'P'
+        used_colors = {color for _, color in image.convert('RGB').getcolors()}
+        assert used_colors <= set(renderer.colors.values())
+        assert renderer.render_to_base64(state)
+
+    def test_invalid_mode(self):
+        """Test unsupported image modes are rejected."""
+        with pytest.raises(ValueError):
+            MarginRenderer(mode='L')
+
+    @pytest.mark.parametrize("mode", ["RGB", "P"])
+    def test_webp_format(self, mode):
+        """Test WebP output decodes and reports its media type."""
+        renderer = MarginRenderer(mode=mode, image_format='WEBP')
+        state = {
+            'total_tokens': 10,
+            'total_chars': 50,
+            'total_words': 10,
+            'line_count': 2,
+            'paragraph_count': 1,
+            'constraints': {'lines': {'target': 4, 'tolerance': 0}},
+            'constraint_status': {'lines': False},
+            'generation_complete': False,
+        }
+
+        data = base64.b64decode(renderer.render_to_base64(state))
+        image = Image.open(io.BytesIO(data))
+        assert image.format == 'WEBP'
+        assert image.size == (renderer.width, renderer.height)
+        assert renderer.media_type == 'image/webp'
+        assert MarginRenderer().media_type == 'image/png'
+
+        with pytest.raises(ValueError):
+            MarginRenderer(image_format='BMP')
+
+    def test_palette_matches_colors(self):
+        """Test the role-indexed palette agrees with the named colors."""
+        for theme in MarginRenderer.THEMES:
+            renderer = MarginRenderer(theme=theme)
+            for role in Role:
+                assert renderer.palette[role] == renderer.colors[role.name.lower()]
+
     def test_format_constraint_text(self):
         """Test constraint text formatting."""
         renderer = MarginRenderer()
@@ -104,6 +311,24 @@ class TestMarginRenderer:
         assert '50' in text
         assert '100' in text
 
+    def test_prepared_labels_follow_constraint_changes(self):
+        """Test labels are rebuilt when the rendered constraints change."""
+        renderer = MarginRenderer()
+        renderer.prepare({'lines': {'target': 4}})
+        state = {
+            'total_tokens': 10,
+            'total_chars': 50,
+            'total_words': 10,
+            'line_count': 2,
+            'paragraph_count': 1,
+            'constraints': {'lines': {'target': 6}},
+            'constraint_status': {'lines': False},
+            'generation_complete': False,
+        }
+
+        renderer.render(state)
+        assert renderer._label_templates['lines'](state) == "Lines: 2/6"
+
     def test_get_constraint_color(self):
         """Test constraint color selection based on status."""
         renderer = MarginRenderer()
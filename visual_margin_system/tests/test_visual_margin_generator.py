@@ -0,0 +1,306 @@
+"""
+Tests for VisualMarginGenerator
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from visual_margin_system.margin_renderer import MarginRenderer
+from visual_margin_system.visual_margin_generator import VisualMarginGenerator
+
+
+class _StubStream:
+    """Stands in for the SDK's message stream, sync and async."""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.consumed = 0
+        self.closed = False
+
+    def _text_stream(self):
+        for delta in self.deltas:
+            self.consumed += 1
+            yield delta
+
+    async def _async_text_stream(self):
+        for delta in self._text_stream():
+            yield delta
+
+    def __enter__(self):
+        return SimpleNamespace(text_stream=self._text_stream())
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+
+    async def __aenter__(self):
+        return SimpleNamespace(text_stream=self._async_text_stream())
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+
+def _stub_streaming_client(deltas):
+    """Build a client whose messages.stream() records its requests."""
+    requests = []
+    streams = []
+
+    def stream(**kwargs):
+        requests.append(kwargs)
+        streams.append(_StubStream(deltas))
+        return streams[-1]
+
+    return SimpleNamespace(messages=SimpleNamespace(stream=stream)), requests, streams
+
+
+def _stub_create_client(chunks, is_async=False):
+    """Build a client whose messages.create() records its requests.
+
+    Each call returns the next chunk; None stands for a response with no content.
+    """
+    requests = []
+    remaining = iter(chunks)
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        chunk = next(remaining)
+        content = [] if chunk is None else [SimpleNamespace(type='text', text=chunk)]
+        return SimpleNamespace(content=content)
+
+    async def create_async(**kwargs):
+        return create(**kwargs)
+
+    messages = SimpleNamespace(create=create_async if is_async else create)
+    return SimpleNamespace(messages=messages), requests
+
+
+class TestVisualMarginGenerator:
+    """Test suite for VisualMarginGenerator class."""
+
+    def test_margin_signature_tracks_warning_indicator(self):
+        """Test a constraint moving into its warning range changes the signature."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        state = {
+            'total_tokens': 5,
+            'total_chars': 100,
+            'total_words': 42,
+            'line_count': 1,
+            'paragraph_count': 1,
+            'constraints': {'words': {'target': 47}},
+            'constraint_status': {'words': False},
+            'generation_complete': False,
+        }
+
+        before = generator._margin_signature(state)
+        after = generator._margin_signature(dict(state, total_words=43))
+
+        # Same word bucket, but 43 is within 10% of the target
+        assert 42 // generator.MARGIN_WORD_BUCKET == 43 // generator.MARGIN_WORD_BUCKET
+        assert before != after
+
+    def test_render_margin_reuses_image_within_bucket(self):
+        """Test the margin is re-rendered only when the signature changes."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        state = {
+            'total_tokens': 5,
+            'total_chars': 100,
+            'total_words': 20,
+            'line_count': 1,
+            'paragraph_count': 1,
+            'constraints': {'words': {'target': 200}},
+            'constraint_status': {'words': False},
+            'generation_complete': False,
+        }
+
+        first = generator._render_margin(state)
+        assert generator._render_margin(dict(state, total_words=21, total_tokens=6)) is first
+        assert generator._render_margin(dict(state, total_words=25)) != first
+
+    def test_messages_without_constraints_are_text_only(self):
+        """Test unconstrained generations send no image and no margin instructions."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        context = generator._build_static_context("Say hi", {})
+
+        messages = generator._build_multimodal_messages(context, "", None)
+        content = messages[0]['content']
+        assert [block['type'] for block in content] == ['text']
+        assert content[0]['text'] == "You are generating a response to: Say hi"
+        assert "margin" not in content[0]['text']
+
+    def test_image_block_uses_renderer_media_type(self):
+        """Test the image block is labelled with the renderer's encoding."""
+        generator = VisualMarginGenerator(
+            api_key="test-key", renderer=MarginRenderer(image_format='WEBP')
+        )
+        constraints = {'lines': {'target': 3, 'tolerance': 0}}
+        context = generator._build_static_context("Write 3 lines", constraints)
+
+        messages = generator._build_multimodal_messages(context, "", "BASE64")
+        image_block, text_block = messages[0]['content']
+        assert image_block['source'] == {
+            'type': 'base64',
+            'media_type': 'image/webp',
+            'data': 'BASE64',
+        }
+        assert "- lines: {'target': 3, 'tolerance': 0}" in text_block['text']
+
+    def test_continuation_wraps_generated_text(self):
+        """Test later requests put the generated text between head and tail."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        generated = "First {line}\nSecond line"
+
+        for constraints, margin in (({'lines': {'target': 3, 'tolerance': 0}}, "BASE64"), ({}, None)):
+            context = generator._build_static_context("Write {3} lines", constraints)
+            _, head, tail = context
+
+            messages = generator._build_multimodal_messages(context, generated, margin)
+            text = messages[0]['content'][-1]['text']
+            assert text == head + generated + tail
+            assert head.startswith("You are continuing to generate a response to: Write {3} lines")
+            assert tail.endswith("Do not repeat what you've already generated.")
+
+    def test_stream_with_margin_tracks_streamed_text(self):
+        """Test streamed deltas update the tracker and the result."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        client, requests, streams = _stub_streaming_client(["Hello ", "wor", "ld\nBye"])
+        generator.client = client
+
+        result = generator.stream_with_margin("Say hello", max_tokens=100)
+
+        assert result == "Hello world\nBye"
+        state = generator.get_state_snapshot()
+        assert state['total_tokens'] == 3
+        assert state['total_words'] == 3
+        assert state['line_count'] == 2
+        assert requests[0]['max_tokens'] == 100
+        assert streams[0].closed
+
+        # No constraints, so no margin image
+        assert [block['type'] for block in requests[0]['messages'][0]['content']] == ['text']
+
+    def test_stream_with_margin_stops_when_constraints_complete(self):
+        """Test the stream ends once all constraints are satisfied."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        deltas = ["Line one\n", "Line two\n", "Line three\n", "Line four\n"]
+        client, requests, streams = _stub_streaming_client(deltas)
+        generator.client = client
+
+        result = generator.stream_with_margin(
+            "Write a poem", constraints={'lines': {'target': 3, 'tolerance': 0}}
+        )
+
+        assert result == "Line one\nLine two\nLine three\n"
+        assert generator.tracker.is_complete()
+        assert streams[0].consumed == 3
+        assert streams[0].closed
+
+        # The request carries the margin for the initial state
+        image_block, text_block = requests[0]['messages'][0]['content']
+        assert image_block['type'] == 'image'
+        assert image_block['source']['media_type'] == generator.renderer.media_type
+        assert image_block['source']['data']
+        assert text_block['text'].startswith("You are generating a response to: Write a poem")
+
+    def test_stream_with_margin_async(self):
+        """Test the async stream tracks text and stops when complete."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        deltas = ["One\n", "Two\n", "Three\n"]
+        client, requests, streams = _stub_streaming_client(deltas)
+        generator.async_client = client
+
+        result = asyncio.run(generator.stream_with_margin_async(
+            "Write a poem", constraints={'lines': {'target': 2, 'tolerance': 0}}
+        ))
+
+        assert result == "One\nTwo\n"
+        assert generator.get_state_snapshot()['line_count'] == 2
+        assert streams[0].consumed == 2
+        assert streams[0].closed
+        assert requests[0]['messages'][0]['content'][0]['type'] == 'image'
+
+    def test_generate_with_margin_sends_margin_per_chunk(self):
+        """Test each chunk request carries the text so far and a fresh margin."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        chunks = ["Line one\n", "Line two\n", "Line three\n", "Line four\n"]
+        client, requests = _stub_create_client(chunks)
+        generator.client = client
+        constraints = {'lines': {'target': 3, 'tolerance': 0}}
+
+        result = generator.generate_with_margin("Write a poem", constraints=constraints, chunk_size=20)
+
+        # Stops once the constraints are complete, without a fourth request
+        assert result == "Line one\nLine two\nLine three\n"
+        assert generator.tracker.is_complete()
+        assert len(requests) == 3
+        assert all(request['max_tokens'] == 20 for request in requests)
+
+        _, head, tail = generator._build_static_context("Write a poem", constraints)
+        texts = [request['messages'][0]['content'][1]['text'] for request in requests]
+        assert texts[0].startswith("You are generating a response to: Write a poem")
+        assert texts[1] == head + "Line one\n" + tail
+        assert texts[2] == head + "Line one\nLine two\n" + tail
+
+        images = [request['messages'][0]['content'][0] for request in requests]
+        assert all(image['type'] == 'image' for image in images)
+        assert all(image['source']['media_type'] == generator.renderer.media_type for image in images)
+        # The line count changes with every chunk, so every margin is new
+        assert len({image['source']['data'] for image in images}) == 3
+
+    def test_generate_with_margin_stops_on_empty_content(self):
+        """Test an empty response ends an unconstrained generation."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        client, requests = _stub_create_client(["Hello ", "world", None, "unused"])
+        generator.client = client
+
+        result = generator.generate_with_margin("Say hello")
+
+        assert result == "Hello world"
+        assert len(requests) == 3
+        assert all(
+            [block['type'] for block in request['messages'][0]['content']] == ['text']
+            for request in requests
+        )
+        _, head, tail = generator._build_static_context("Say hello", {})
+        assert requests[2]['messages'][0]['content'][0]['text'] == head + "Hello world" + tail
+
+    def test_generate_with_margin_limits_requests(self):
+        """Test max_tokens bounds the number of chunk requests."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        client, requests = _stub_create_client(["word "] * 10)
+        generator.client = client
+
+        result = generator.generate_with_margin("Say hello", max_tokens=100, chunk_size=50)
+
+        assert result == "word word word "
+        assert len(requests) == 3
+
+    def test_generate_with_margin_async(self):
+        """Test the async loop sends the same requests and stops when complete."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        chunks = ["One\n", "Two\n", "Three\n"]
+        client, requests = _stub_create_client(chunks, is_async=True)
+        generator.async_client = client
+        constraints = {'lines': {'target': 2, 'tolerance': 0}}
+
+        result = asyncio.run(generator.generate_with_margin_async("Write a poem", constraints=constraints))
+
+        assert result == "One\nTwo\n"
+        assert generator.get_state_snapshot()['line_count'] == 2
+        assert len(requests) == 2
+
+        _, head, tail = generator._build_static_context("Write a poem", constraints)
+        image_block, text_block = requests[1]['messages'][0]['content']
+        assert image_block['type'] == 'image'
+        assert image_block['source']['data'] != requests[0]['messages'][0]['content'][0]['source']['data']
+        assert text_block['text'] == head + "One\n" + tail
+
+    def test_generate_with_margin_async_stops_on_empty_content(self):
+        """Test an empty response ends an unconstrained async generation."""
+        generator = VisualMarginGenerator(api_key="test-key")
+        client, requests = _stub_create_client(["Hi", None], is_async=True)
+        generator.async_client = client
+
+        result = asyncio.run(generator.generate_with_margin_async("Say hi"))
+
+        assert result == "Hi"
+        assert len(requests) == 2
+        assert [block['type'] for block in requests[0]['messages'][0]['content']] == ['text']
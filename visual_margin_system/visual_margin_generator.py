@@ -5,7 +5,8 @@ Orchestrates the generation loop with margin awareness, combining
 state tracking, rendering, and multimodal LLM integration.
 """
 
-from typing import Dict, Any, Optional, List
+import asyncio
+from typing import Dict, Any, Optional, List, Tuple
 from anthropic import Anthropic, AsyncAnthropic
 
 from .generation_state_tracker import GenerationStateTracker
@@ -16,6 +17,11 @@ from .constraint_parser import ConstraintParser
 class VisualMarginGenerator:
     """Orchestrates text generation with visual margin state tracking."""
 
+    # Word and character counts within the same bucket reuse the last margin
+    # rather than rendering a new one (see _margin_signature)
+    MARGIN_WORD_BUCKET = 5
+    MARGIN_CHAR_BUCKET = 25
+
     def __init__(
         self,
         api_key: Optional[str] = None,
@@ -40,6 +46,9 @@ class VisualMarginGenerator:
         self.renderer = renderer or MarginRenderer()
         self.tracker = tracker or GenerationStateTracker()
         self.parser = parser or ConstraintParser()
+        # Signature and image of the last margin sent, see _render_margin
+        self._last_sig: Optional[Tuple] = None
+        self._last_margin_b64: Optional[str] = None
 
     def generate_with_margin(
         self,
@@ -62,19 +71,8 @@ class VisualMarginGenerator:
         Returns:
             Generated text
         """
-        # Parse constraints from prompt if not provided
-        if constraints is None and parse_constraints:
-            constraints = self.parser.parse(prompt)
-
-        # If still no constraints, use empty dict
-        if constraints is None:
-            constraints = {}
-
-        # Initialize tracker with constraints
-        self.tracker.reset()
-        self.tracker.set_constraints(constraints)
+        constraints, context = self._start_generation(prompt, constraints, parse_constraints)
 
-        generated_text = ""
         iteration = 0
         max_iterations = (max_tokens // chunk_size) + 1
 
@@ -83,16 +81,16 @@ class VisualMarginGenerator:
             if constraints and self.tracker.is_complete():
                 break
 
-            # Render current margin state
+            # Render current margin state. Without constraints there is no
+            # checklist to show, so the model gets the text alone.
             state_snapshot = self.tracker.get_state_snapshot()
-            margin_b64 = self.renderer.render_to_base64(state_snapshot)
+            margin_b64 = self._render_margin(state_snapshot) if constraints else None
 
             # Construct multimodal prompt
             messages = self._build_multimodal_messages(
-                prompt=prompt,
-                generated_so_far=generated_text,
-                margin_image_b64=margin_b64,
-                constraints=constraints
+                context=context,
+                generated_so_far=state_snapshot['generated_text'],
+                margin_image_b64=margin_b64
             )
 
             try:
@@ -103,14 +101,7 @@ class VisualMarginGenerator:
                     messages=messages
                 )
 
-                # Extract generated chunk
-                if response.content and len(response.content) > 0:
-                    chunk = response.content[0].text
-                    generated_text += chunk
-
-                    # Update tracker with new content
-                    self.tracker.update_with_token(chunk)
-                else:
+                if not self._apply_response(response):
                     # No more content generated
                     break
 
@@ -121,7 +112,7 @@ class VisualMarginGenerator:
 
             iteration += 1
 
-        return generated_text
+        return self.tracker.get_state_snapshot()['generated_text']
 
     async def generate_with_margin_async(
         self,
@@ -151,19 +142,8 @@ class VisualMarginGenerator:
         Returns:
             Generated text
         """
-        # Parse constraints from prompt if not provided
-        if constraints is None and parse_constraints:
-            constraints = self.parser.parse(prompt)
+        constraints, context = self._start_generation(prompt, constraints, parse_constraints)
 
-        # If still no constraints, use empty dict
-        if constraints is None:
-            constraints = {}
-
-        # Initialize tracker with constraints
-        self.tracker.reset()
-        self.tracker.set_constraints(constraints)
-
-        generated_text = ""
         iteration = 0
         max_iterations = (max_tokens // chunk_size) + 1
 
@@ -172,16 +152,22 @@ class VisualMarginGenerator:
             if constraints and self.tracker.is_complete():
                 break
 
-            # Render current margin state
+            # Render current margin state in a worker thread, so other tasks
+            # on the event loop keep running while PIL draws and encodes.
+            # Without constraints there is no checklist to show, so the model
+            # gets the text alone.
             state_snapshot = self.tracker.get_state_snapshot()
-            margin_b64 = self.renderer.render_to_base64(state_snapshot)
+            margin_b64 = None
+            if constraints:
+                margin_b64 = await asyncio.get_running_loop().run_in_executor(
+                    None, self._render_margin, state_snapshot
+                )
 
             # Construct multimodal prompt
             messages = self._build_multimodal_messages(
-                prompt=prompt,
-                generated_so_far=generated_text,
-                margin_image_b64=margin_b64,
-                constraints=constraints
+                context=context,
+                generated_so_far=state_snapshot['generated_text'],
+                margin_image_b64=margin_b64
             )
 
             try:
@@ -192,14 +178,7 @@ class VisualMarginGenerator:
                     messages=messages
                 )
 
-                # Extract generated chunk
-                if response.content and len(response.content) > 0:
-                    chunk = response.content[0].text
-                    generated_text += chunk
-
-                    # Update tracker with new content
-                    self.tracker.update_with_token(chunk)
-                else:
+                if not self._apply_response(response):
                     # No more content generated
                     break
 
@@ -210,69 +189,307 @@ class VisualMarginGenerator:
 
             iteration += 1
 
-        return generated_text
+        return self.tracker.get_state_snapshot()['generated_text']
 
-    def _build_multimodal_messages(
+    def stream_with_margin(
         self,
         prompt: str,
-        generated_so_far: str,
-        margin_image_b64: str,
-        constraints: Dict[str, Any]
-    ) -> List[Dict[str, Any]]:
+        constraints: Optional[Dict[str, Any]] = None,
+        max_tokens: int = 2048,
+        parse_constraints: bool = True
+    ) -> str:
         """
-        Construct message array with text context and visual margin.
+        Generate text in a single streaming API call (synchronous version).
+
+        The margin for the initial state is sent with the request, and the
+        tracker follows the streamed text, ending the stream as soon as all
+        constraints are satisfied. This saves the per-chunk round trips of
+        generate_with_margin, but the model never sees the margin update.
 
         Args:
-            prompt: Original user prompt
-            generated_so_far: Text generated so far
-            margin_image_b64: Base64-encoded margin image
+            prompt: User prompt
+            constraints: Dictionary of constraint specifications (or None to parse from prompt)
+            max_tokens: Maximum total tokens to generate
+            parse_constraints: Whether to parse constraints from prompt if not provided
+
+        Returns:
+            Generated text
+        """
+        constraints, context = self._start_generation(prompt, constraints, parse_constraints)
+        messages = self._build_initial_messages(context, constraints)
+
+        try:
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=messages
+            ) as stream:
+                for text in stream.text_stream:
+                    self.tracker.update_with_token(text)
+                    if constraints and self.tracker.is_complete():
+                        break
+
+        except Exception as e:
+            # Handle API errors gracefully
+            print(f"Error during generation: {e}")
+
+        return self.tracker.get_state_snapshot()['generated_text']
+
+    async def stream_with_margin_async(
+        self,
+        prompt: str,
+        constraints: Optional[Dict[str, Any]] = None,
+        max_tokens: int = 2048,
+        parse_constraints: bool = True
+    ) -> str:
+        """
+        Generate text in a single streaming API call (async version).
+
+        See stream_with_margin.
+
+        Args:
+            prompt: User prompt
+            constraints: Dictionary of constraint specifications (or None to parse from prompt)
+            max_tokens: Maximum total tokens to generate
+            parse_constraints: Whether to parse constraints from prompt if not provided
+
+        Returns:
+            Generated text
+        """
+        constraints, context = self._start_generation(prompt, constraints, parse_constraints)
+        messages = self._build_initial_messages(context, constraints)
+
+        try:
+            async with self.async_client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=messages
+            ) as stream:
+                async for text in stream.text_stream:
+                    self.tracker.update_with_token(text)
+                    if constraints and self.tracker.is_complete():
+                        break
+
+        except Exception as e:
+            # Handle API errors gracefully
+            print(f"Error during generation: {e}")
+
+        return self.tracker.get_state_snapshot()['generated_text']
+
+    def _apply_response(self, response: Any) -> bool:
+        """
+        Feed the chunk from an API response to the tracker.
+
+        Shared by the sync and async generation loops, which differ only in
+        how they call the API and render the margin.
+
+        Args:
+            response: Response from messages.create
+
+        Returns:
+            False if the response had no content, True otherwise
+        """
+        if not response.content:
+            return False
+
+        # Update tracker with new content, which also keeps the text
+        # generated so far
+        self.tracker.update_with_token(response.content[0].text)
+        return True
+
+    def _start_generation(
+        self,
+        prompt: str,
+        constraints: Optional[Dict[str, Any]],
+        parse_constraints: bool
+    ) -> Tuple[Dict[str, Any], Tuple[str, str, str]]:
+        """
+        Resolve the constraints and reset state for a new generation.
+
+        Args:
+            prompt: User prompt
+            constraints: Dictionary of constraint specifications (or None to parse from prompt)
+            parse_constraints: Whether to parse constraints from prompt if not provided
+
+        Returns:
+            (constraints, instruction text from _build_static_context)
+        """
+        # Parse constraints from prompt if not provided
+        if constraints is None and parse_constraints:
+            constraints = self.parser.parse(prompt)
+
+        # If still no constraints, use empty dict
+        if constraints is None:
+            constraints = {}
+
+        # Initialize tracker and margin labels with constraints
+        self.tracker.reset()
+        self.tracker.set_constraints(constraints)
+        self.renderer.prepare(constraints)
+        self._last_sig = None
+        self._last_margin_b64 = None
+
+        # Instruction text that doesn't change between iterations
+        context = self._build_static_context(prompt, constraints)
+
+        return constraints, context
+
+    def _build_initial_messages(self, context: Tuple[str, str, str], constraints: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Construct the messages for the start of a generation.
+
+        Args:
+            context: Instruction text from _build_static_context
             constraints: Active constraints
 
         Returns:
             List of message dictionaries for API
         """
-        # Build the instruction text
-        if generated_so_far:
-            instruction = f"""You are continuing to generate a response to: {prompt}
+        margin_b64 = None
+        if constraints:
+            margin_b64 = self._render_margin(self.tracker.get_state_snapshot())
+        return self._build_multimodal_messages(context, "", margin_b64)
+
+    def _render_margin(self, state: Dict[str, Any]) -> str:
+        """
+        Render the margin for a state, reusing the last image when the state
+        hasn't changed materially since it was rendered.
+
+        Args:
+            state: State snapshot from GenerationStateTracker
+
+        Returns:
+            Base64-encoded margin image
+        """
+        sig = self._margin_signature(state)
+        if sig is None or sig != self._last_sig:
+            self._last_margin_b64 = self.renderer.render_to_base64(state)
+            self._last_sig = sig
+        return self._last_margin_b64
+
+    def _margin_signature(self, state: Dict[str, Any]) -> Optional[Tuple]:
+        """
+        Summarize the parts of a state that matter to the model reading the
+        margin: exact line and paragraph counts, each constraint's status
+        indicator (including the near-target warning), and word and
+        character counts to the nearest bucket.
+
+        Args:
+            state: State snapshot from GenerationStateTracker
+
+        Returns:
+            Hashable signature, or None if the state can't be summarized
+        """
+        try:
+            status = tuple(sorted(state['constraint_status'].items()))
+        except (KeyError, AttributeError, TypeError):
+            return None
+
+        # The warning indicator can change within a bucket, e.g. when the
+        # word count comes within 10% of its target
+        constraint_status = state['constraint_status']
+        roles = tuple(
+            None if constraint_status.get(constraint_type)
+            else self.renderer._get_constraint_role(state, constraint_type, constraint_spec)
+            for constraint_type, constraint_spec in (state.get('constraints') or {}).items()
+        )
+
+        return (
+            state['line_count'],
+            state['paragraph_count'],
+            status,
+            roles,
+            state['total_words'] // self.MARGIN_WORD_BUCKET,
+            state['total_chars'] // self.MARGIN_CHAR_BUCKET,
+            state['generation_complete'],
+        )
+
+    def _build_static_context(self, prompt: str, constraints: Dict[str, Any]) -> Tuple[str, str, str]:
+        """
+        Build the instruction text that stays the same for a whole generation.
+
+        Args:
+            prompt: Original user prompt
+            constraints: Active constraints
+
+        Returns:
+            (initial instruction, continuation head, continuation tail); the
+            text generated so far goes between the head and the tail
+        """
+        continuation_head = f"""You are continuing to generate a response to: {prompt}
 
 You have generated so far:
-{generated_so_far}
+"""
+        important = "Important: Only generate the next portion of text. Do not repeat what you've already generated."
 
-The visual margin image shows your current generation state and constraint satisfaction status.
-Pay close attention to the constraint checklist and current counts shown in the margin.
-Continue generation while monitoring the margin to ensure you satisfy all constraints.
+        if not constraints:
+            # No margin image is sent, so the instructions don't mention it
+            return f"You are generating a response to: {prompt}", continuation_head, "\n\n" + important
 
-Important: Only generate the next portion of text. Do not repeat what you've already generated."""
-        else:
-            constraint_desc = ""
-            if constraints:
-                constraint_desc = "\n\nConstraints to satisfy:\n"
-                for ctype, cspec in constraints.items():
-                    constraint_desc += f"- {ctype}: {cspec}\n"
+        constraint_desc = "\n\nConstraints to satisfy:\n"
+        for ctype, cspec in constraints.items():
+            constraint_desc += f"- {ctype}: {cspec}\n"
 
-            instruction = f"""You are generating a response to: {prompt}{constraint_desc}
+        initial_instruction = f"""You are generating a response to: {prompt}{constraint_desc}
 
 The visual margin image shows your current generation state and constraint satisfaction status.
 Pay close attention to the constraint checklist and current counts shown in the margin.
 Generate text while monitoring the margin to ensure you satisfy all constraints."""
 
+        continuation_tail = f"""
+
+The visual margin image shows your current generation state and constraint satisfaction status.
+Pay close attention to the constraint checklist and current counts shown in the margin.
+Continue generation while monitoring the margin to ensure you satisfy all constraints.
+
+{important}"""
+
+        return initial_instruction, continuation_head, continuation_tail
+
+    def _build_multimodal_messages(
+        self,
+        context: Tuple[str, str, str],
+        generated_so_far: str,
+        margin_image_b64: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Construct message array with text context and visual margin.
+
+        Args:
+            context: Instruction text from _build_static_context
+            generated_so_far: Text generated so far
+            margin_image_b64: Base64-encoded margin image, or None to send
+                the text alone
+
+        Returns:
+            List of message dictionaries for API
+        """
+        initial_instruction, continuation_head, continuation_tail = context
+        if generated_so_far:
+            instruction = continuation_head + generated_so_far + continuation_tail
+        else:
+            instruction = initial_instruction
+
+        content = [
+            {
+                "type": "text",
+                "text": instruction
+            }
+        ]
+        if margin_image_b64 is not None:
+            content.insert(0, {
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": self.renderer.media_type,
+                    "data": margin_image_b64
+                }
+            })
+
         return [
             {
                 "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/png",
-                            "data": margin_image_b64
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": instruction
-                    }
-                ]
+                "content": content
             }
         ]
 